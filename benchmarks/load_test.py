@@ -0,0 +1,571 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable
+
+import websockets
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+ACTION_TIMEOUT = 15
+# A session that ran the default workload retains about 75 KiB, this leaves
+# room for a longer run without letting a leak through
+MAX_SESSION_KIB = 256
+
+# Each step is [action, *args], see SimulatedClient.ACTIONS
+DEFAULT_WORKLOAD: list[list[Any]] = [
+    ["add_name"],
+    ["open_record_view"],
+    ["add_record", "Credit"],
+    ["add_record", "Debit"],
+    ["edit_record"],
+    ["delete_record"],
+    ["close_record_view"],
+    ["delete_name"],
+]
+
+
+class ActionTimeout(Exception):
+    pass
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.received_messages = 0
+        self.received_bytes = 0
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+
+class SimulatedClient:
+    def __init__(self, url: str, stats: Stats, rng: random.Random):
+        self.url: str = url
+        self.stats: Stats = stats
+        self.rng: random.Random = rng
+        self.controls: dict[str, dict[str, Any]] = {}
+        self.changed = asyncio.Event()
+        self.ACTIONS: dict[str, Callable] = {
+            "add_name": self.add_name,
+            "open_record_view": self.open_record_view,
+            "add_record": self.add_record,
+            "edit_record": self.edit_record,
+            "delete_record": self.delete_record,
+            "close_record_view": self.close_record_view,
+            "delete_name": self.delete_name,
+        }
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_size=None)
+        self.receiver = asyncio.create_task(self.receive_loop())
+        await self.send(
+            "registerWebClient",
+            {
+                "pageName": "",
+                "pageRoute": "/",
+                "pageWidth": "1280",
+                "pageHeight": "720",
+                "windowWidth": "1280",
+                "windowHeight": "720",
+                "windowTop": "0",
+                "windowLeft": "0",
+                "isPWA": "false",
+                "isWeb": "true",
+                "isDebug": "false",
+                "platform": "linux",
+                "platformBrightness": "dark",
+                "media": "{}",
+                "sessionId": "",
+            },
+        )
+        await self.wait_for(
+            lambda: "page" in self.controls
+            and self.top_view() is not None
+            and self.idle()
+        )
+
+    async def close(self):
+        await self.send("pageEventFromWeb", self.event("page", "close"))
+        self.receiver.cancel()
+        await self.ws.close()
+
+    # Protocol
+
+    async def send(self, action: str, payload: Any):
+        message = json.dumps({"action": action, "payload": payload})
+        self.stats.sent_messages += 1
+        self.stats.sent_bytes += len(message)
+        await self.ws.send(message)
+
+    def event(self, target: str, name: str, data: str = "") -> dict[str, str]:
+        return {"eventTarget": target, "eventName": name, "eventData": data}
+
+    async def click(self, control: dict[str, Any]):
+        await self.send("pageEventFromWeb", self.event(control["i"], "click"))
+
+    async def set_value(self, control: dict[str, Any], value: str):
+        control["value"] = value
+        await self.send(
+            "updateControlProps", {"props": [{"i": control["i"], "value": value}]}
+        )
+
+    async def receive_loop(self):
+        async for raw in self.ws:
+            self.stats.received_messages += 1
+            self.stats.received_bytes += len(raw)
+            self.apply(json.loads(raw))
+            self.changed.set()
+
+    def apply(self, message: dict[str, Any]):
+        # Mirrors the control snapshot flet keeps for a browser client
+        action, payload = message["action"], message["payload"]
+        if action == "registerWebClient":
+            self.controls = payload["session"]["controls"]
+        elif action == "pageControlsBatch":
+            for i in payload:
+                self.apply(i)
+        elif action == "addPageControls":
+            for control in payload["controls"]:
+                parent = self.controls[control["p"]]
+                if control["i"] not in parent["c"]:
+                    if "at" in control:
+                        parent["c"].insert(int(control["at"]), control["i"])
+                    else:
+                        parent["c"].append(control["i"])
+                self.controls[control["i"]] = control
+        elif action == "updateControlProps":
+            for props in payload["props"]:
+                if props["i"] in self.controls:
+                    self.controls[props["i"]].update(props)
+        elif action == "removeControl":
+            for i in payload["ids"]:
+                control = self.controls.pop(i, None)
+                if control is None:
+                    continue
+                self.drop_descendants(control)
+                parent = self.controls.get(control["p"])
+                if parent and i in parent["c"]:
+                    parent["c"].remove(i)
+        elif action == "cleanControl":
+            for i in payload["ids"]:
+                if i in self.controls:
+                    self.drop_descendants(self.controls[i])
+                    self.controls[i]["c"] = []
+        elif action == "sessionCrashed":
+            raise RuntimeError(payload["message"])
+
+    def drop_descendants(self, control: dict[str, Any]):
+        for i in control["c"]:
+            child = self.controls.pop(i, None)
+            if child is not None:
+                self.drop_descendants(child)
+
+    # Snapshot queries
+
+    def find(self, root: dict[str, Any], t: str, **attrs: str) -> list[dict[str, Any]]:
+        found = []
+        stack = list(reversed(root["c"]))
+        while stack:
+            control = self.controls.get(stack.pop())
+            if control is None:
+                continue
+            if control["t"] == t and all(control.get(k) == v for k, v in attrs.items()):
+                found.append(control)
+            stack.extend(reversed(control["c"]))
+        return found
+
+    def top_view(self) -> dict[str, Any] | None:
+        views = self.find(self.controls["page"], "view")
+        return views[-1] if views else None
+
+    def idle(self) -> bool:
+        return not self.find(self.controls["page"], "progressring")
+
+    def open_dialog(self) -> dict[str, Any] | None:
+        dialogs = self.find(self.controls["page"], "alertdialog", open="true")
+        return dialogs[-1] if dialogs else None
+
+    def list_items(self, t: str) -> list[dict[str, Any]]:
+        view = self.top_view()
+        items = self.find(view, "listview")
+        if not items:
+            return []
+        return [self.controls[i] for i in items[0]["c"] if self.controls[i]["t"] == t]
+
+    async def wait_for(
+        self, predicate: Callable[[], Any], timeout: float = ACTION_TIMEOUT
+    ):
+        deadline = time.perf_counter() + timeout
+        while not (result := predicate()):
+            self.changed.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise ActionTimeout
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise ActionTimeout from None
+        return result
+
+    async def submit_dialog(self, *values: str):
+        dialog = await self.wait_for(self.open_dialog)
+        for field, value in zip(self.find(dialog, "textfield"), values):
+            await self.set_value(field, value)
+        await self.click(self.find(dialog, "textbutton", text="Confirm")[0])
+
+    # Actions
+
+    async def add_name(self):
+        count = len(self.list_items("card"))
+        await self.click(self.find(self.top_view(), "floatingactionbutton")[0])
+        await self.submit_dialog("User " + "".join(self.rng.choices("abcdefgh", k=6)))
+        await self.wait_for(
+            lambda: len(self.list_items("card")) > count and self.idle()
+        )
+
+    async def open_record_view(self):
+        card = self.rng.choice(self.list_items("card"))
+        await self.click(self.controls[card["c"][0]])
+        await self.wait_for(lambda: self.top_view()["route"] != "/" and self.idle())
+
+    async def add_record(self, type: str = "Credit"):
+        count = len(self.list_items("stack"))
+        await self.click(self.find(self.top_view(), "elevatedbutton", text=type)[0])
+        await self.submit_dialog(
+            "Load test", "Scripted record", str(self.rng.randint(1, 10_000))
+        )
+        await self.wait_for(
+            lambda: len(self.list_items("stack")) > count and self.idle()
+        )
+
+    async def edit_record(self):
+        records = self.list_items("stack")
+        if not records:
+            return
+        record = self.rng.choice(records)
+        button = self.find(record, "iconbutton", icon="edit")[0]
+        await self.click(button)
+        field = await self.wait_for(lambda: self.find(record, "textfield"))
+        title = "Edited " + "".join(self.rng.choices("abcdefgh", k=6))
+        await self.set_value(field[0], title)
+        await self.click(button)
+        await self.wait_for(lambda: self.find(record, "text", value=title))
+
+    async def delete_record(self):
+        records = self.list_items("stack")
+        if not records:
+            return
+        record = self.rng.choice(records)
+        await self.click(self.find(record, "floatingactionbutton", icon="delete")[0])
+        await self.wait_for(
+            lambda: len(self.list_items("stack")) < len(records) and self.idle()
+        )
+
+    async def close_record_view(self):
+        view = self.top_view()
+        if view["route"] == "/":
+            return
+        await self.send("pageEventFromWeb", self.event("page", "view_pop", view["i"]))
+        await self.wait_for(lambda: self.top_view()["route"] == "/")
+
+    async def delete_name(self):
+        cards = self.list_items("card")
+        if not cards:
+            return
+        card = self.rng.choice(cards)
+        await self.click(self.find(card, "elevatedbutton", text="Delete")[0])
+        await self.wait_for(
+            lambda: len(self.list_items("card")) < len(cards) and self.idle()
+        )
+
+    async def run(self, workload: list[list[Any]], iterations: int, think: float):
+        for _ in range(iterations):
+            for action, *args in workload:
+                start = time.perf_counter()
+                try:
+                    await self.ACTIONS[action](*args)
+                except (ActionTimeout, IndexError, KeyError):
+                    # The mirrored UI is in an unknown state, stop this client
+                    self.stats.errors[action] += 1
+                    return
+                self.stats.latencies[action].append(time.perf_counter() - start)
+                if think:
+                    await asyncio.sleep(self.rng.uniform(0, think))
+
+
+class Server:
+    def __init__(self, port: int, diagnostics: bool = False):
+        self.port: int = port
+        self.diagnostics: bool = diagnostics
+        self.process: subprocess.Popen | None = None
+        self.cpu_samples: list[float] = []
+        self.peak_rss: int = 0
+
+    def start(self):
+        env = dict(os.environ, DT_EXPORT_ASGI="1")
+        if self.diagnostics:
+            env["DT_DIAGNOSTICS"] = "1"
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "dt.main:app",
+                "--port",
+                str(self.port),
+                "--log-level",
+                "warning",
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            self.stop()
+            raise RuntimeError("Server did not start")
+        self.psutil = psutil.Process(self.process.pid) if psutil else None
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+    def report(self) -> dict[str, Any]:
+        url = f"http://127.0.0.1:{self.port}/diagnostics"
+        with urllib.request.urlopen(url, timeout=120) as response:
+            return json.load(response)
+
+    async def sample(self, interval: float = 0.5):
+        if self.psutil is None:
+            return
+        self.psutil.cpu_percent()
+        while True:
+            await asyncio.sleep(interval)
+            self.cpu_samples.append(self.psutil.cpu_percent())
+            self.peak_rss = max(self.peak_rss, self.psutil.memory_info().rss)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values: list[float]) -> tuple[float, float, float]:
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+async def run_level(
+    sessions: int,
+    workload: list[list[Any]],
+    iterations: int,
+    think: float,
+    ramp: float,
+    diagnostics: bool = False,
+) -> dict[str, Any]:
+    server = Server(free_port(), diagnostics)
+    server.start()
+    stats = Stats()
+    sampler = asyncio.create_task(server.sample())
+    try:
+        url = f"ws://127.0.0.1:{server.port}/ws"
+        clients = [
+            SimulatedClient(url, stats, random.Random(i)) for i in range(sessions)
+        ]
+
+        async def session(i: int, client: SimulatedClient):
+            await asyncio.sleep(ramp * i / sessions)
+            try:
+                await client.connect()
+            except ActionTimeout:
+                stats.errors["connect"] += 1
+                return
+            await client.run(workload, iterations, think)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session(i, c) for i, c in enumerate(clients)))
+        elapsed = time.perf_counter() - start
+        if psutil:
+            server.peak_rss = max(server.peak_rss, server.psutil.memory_info().rss)
+        # Sessions are still open here, so their memory can be accounted for
+        report = await asyncio.to_thread(server.report) if diagnostics else None
+        for client in clients:
+            if client.controls:
+                await client.close()
+    finally:
+        sampler.cancel()
+        server.stop()
+
+    return {
+        "sessions": sessions,
+        "elapsed": elapsed,
+        "actions": {
+            action: dict(
+                zip(("p50", "p95", "p99"), percentiles(values)), count=len(values)
+            )
+            for action, values in stats.latencies.items()
+        },
+        "errors": dict(stats.errors),
+        "received_messages_per_second": stats.received_messages / elapsed,
+        "received_bytes_per_second": stats.received_bytes / elapsed,
+        "sent_messages_per_second": stats.sent_messages / elapsed,
+        "sent_bytes_per_second": stats.sent_bytes / elapsed,
+        "server_cpu_percent": (
+            statistics.mean(server.cpu_samples) if server.cpu_samples else None
+        ),
+        "server_peak_rss_mb": server.peak_rss / 2**20 if psutil else None,
+        "diagnostics": report,
+    }
+
+
+def print_level(result: dict[str, Any]):
+    print(f"\n== {result['sessions']} sessions, {result['elapsed']:.1f}s ==")
+    print(f"{'action':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for action, row in result["actions"].items():
+        print(
+            f"{action:<20}{row['count']:>7}{row['p50'] * 1000:>10.1f}"
+            f"{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}"
+        )
+    if result["errors"]:
+        print("errors:", result["errors"])
+    print(
+        f"in: {result['received_messages_per_second']:.1f} msg/s,"
+        f" {result['received_bytes_per_second'] / 1024:.1f} KiB/s"
+        f"  out: {result['sent_messages_per_second']:.1f} msg/s,"
+        f" {result['sent_bytes_per_second'] / 1024:.1f} KiB/s"
+    )
+    if result["server_cpu_percent"] is None:
+        print("server cpu/memory: install psutil to sample")
+    else:
+        print(
+            f"server cpu: {result['server_cpu_percent']:.1f}%"
+            f"  peak rss: {result['server_peak_rss_mb']:.1f} MiB"
+        )
+    report = result["diagnostics"]
+    if report is None:
+        return
+    retained = [i["retained_bytes"] for i in report["sessions"]]
+    print(
+        f"leaked: {len(report['leaks'])}  live: {report['live']}"
+        f"  traced: {report['traced_bytes'] / 2**20:.1f} MiB"
+    )
+    if retained:
+        print(
+            f"per session retained: mean {statistics.mean(retained) / 1024:.1f} KiB,"
+            f" max {max(retained) / 1024:.1f} KiB"
+        )
+    for leak in report["leaks"][:10]:
+        print(f"  {leak['kind']} held by: " + " <- ".join(leak["chain"][1:]))
+    if report["top_allocations"]:
+        print("top allocations since the first session:")
+        for line in report["top_allocations"][:5]:
+            print("  " + line)
+
+
+def check(result: dict[str, Any], args: argparse.Namespace) -> list[str]:
+    report = result["diagnostics"]
+    failures = []
+    if len(report["leaks"]) > args.max_leaks:
+        failures.append(
+            f"{result['sessions']} sessions: {len(report['leaks'])} removed"
+            f" controls survived, at most {args.max_leaks} allowed"
+        )
+    if args.max_session_kib:
+        for session in report["sessions"]:
+            if session["retained_bytes"] / 1024 > args.max_session_kib:
+                failures.append(
+                    f"{result['sessions']} sessions: session {session['session']}"
+                    f" retains {session['retained_bytes'] / 1024:.1f} KiB,"
+                    f" at most {args.max_session_kib} KiB allowed"
+                )
+    return failures
+
+
+async def main(args: argparse.Namespace):
+    workload = DEFAULT_WORKLOAD
+    if args.workload:
+        workload = json.loads(Path(args.workload).read_text())
+    results = []
+    failures = []
+    for sessions in args.sessions:
+        result = await run_level(
+            sessions,
+            workload,
+            args.iterations,
+            args.think,
+            args.ramp,
+            args.diagnostics,
+        )
+        print_level(result)
+        results.append(result)
+        if args.diagnostics:
+            failures.extend(check(result, args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    if failures:
+        print("\nFAILED:\n" + "\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate concurrent browser sessions against a local server"
+    )
+    parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1, 10, 50], help="levels of N"
+    )
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument(
+        "--workload", help="JSON list of [action, *args] steps to replay"
+    )
+    parser.add_argument(
+        "--think", type=float, default=0.0, help="max random pause between actions"
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=2.0, help="seconds over which sessions connect"
+    )
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument(
+        "--diagnostics",
+        action="store_true",
+        help="track removed controls and session memory on the server",
+    )
+    parser.add_argument(
+        "--max-leaks",
+        type=int,
+        default=0,
+        help="fail when more removed controls than this survive",
+    )
+    parser.add_argument(
+        "--max-session-kib",
+        type=float,
+        default=MAX_SESSION_KIB,
+        help="fail when a session retains more than this, 0 to not check",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,251 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterable, Iterator, Literal, NamedTuple
+
+# Layout: header, then fixed-width columns
+#   timestamps  int64[rows]       microseconds since epoch, ascending
+#   amounts     int64[rows]       amount * 10**AMOUNT_SCALE
+#   offsets     uint64[2*rows+1]  title/description boundaries in the heap
+#   flags       uint8[rows]       record type
+# followed by the UTF-8 string heap.
+MAGIC = b"DTARCH\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sH6xQqqQ")
+AMOUNT_SCALE = 4
+
+CREDIT = 1
+DEBIT = 2
+TYPE_FLAGS: dict[str, int] = {"Credit": CREDIT, "Debit": DEBIT}
+FLAG_TYPES: dict[int, str] = {v: k for k, v in TYPE_FLAGS.items()}
+
+
+class ArchivedRecord(NamedTuple):
+    type: Literal["Credit", "Debit"]
+    title: str
+    description: str
+    amount: Decimal
+    dateCreated: datetime
+
+
+def to_units(amount: Decimal) -> int:
+    units = int(amount.scaleb(AMOUNT_SCALE))
+    if Decimal(units).scaleb(-AMOUNT_SCALE) != amount:
+        raise ValueError(f"Amount {amount} has more than {AMOUNT_SCALE} decimal places")
+    return units
+
+
+def from_units(units: int) -> Decimal:
+    return Decimal(units).scaleb(-AMOUNT_SCALE)
+
+
+def to_micros(date: datetime) -> int:
+    return round(date.timestamp() * 1_000_000)
+
+
+def from_micros(micros: int) -> datetime:
+    return datetime.fromtimestamp(micros / 1_000_000)
+
+
+class RecordArchive:
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, rows, credit, debit, heap_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} record archive")
+        self.rows: int = rows
+        self._credit_units: int = credit
+        self._debit_units: int = debit
+
+        # Columns are zero-copy views into the mapping, nothing is read until
+        # it is indexed
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self.timestamps = view[start : start + 8 * rows].cast("q")
+        start += 8 * rows
+        self.amounts = view[start : start + 8 * rows].cast("q")
+        start += 8 * rows
+        self.offsets = view[start : start + 8 * (2 * rows + 1)].cast("Q")
+        start += 8 * (2 * rows + 1)
+        self.flags = view[start : start + rows]
+        start += rows
+        self.heap = view[start : start + heap_size]
+        self._heap_start = start
+        self._view = view
+
+    def __enter__(self) -> "RecordArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Views must be released before the mapping can be closed
+        for name in ("timestamps", "amounts", "offsets", "flags", "heap", "_view"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, index: int) -> ArchivedRecord:
+        if index < 0:
+            index += self.rows
+        if not 0 <= index < self.rows:
+            raise IndexError("archive index out of range")
+        return ArchivedRecord(
+            type=FLAG_TYPES[self.flags[index]],
+            title=self._string(2 * index),
+            description=self._string(2 * index + 1),
+            amount=from_units(self.amounts[index]),
+            dateCreated=from_micros(self.timestamps[index]),
+        )
+
+    def __iter__(self) -> Iterator[ArchivedRecord]:
+        return self.page(0, self.rows)
+
+    def _string(self, field: int) -> str:
+        return str(self.heap[self.offsets[field] : self.offsets[field + 1]], "utf-8")
+
+    def page(self, start: int, stop: int) -> Iterator[ArchivedRecord]:
+        for index in range(max(start, 0), min(stop, self.rows)):
+            yield self[index]
+
+    @property
+    def credit_total(self) -> Decimal:
+        return from_units(self._credit_units)
+
+    @property
+    def debit_total(self) -> Decimal:
+        return from_units(self._debit_units)
+
+    @property
+    def last_timestamp(self) -> int | None:
+        return self.timestamps[-1] if self.rows else None
+
+    def index_range(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> tuple[int, int]:
+        i = 0 if start is None else bisect_left(self.timestamps, to_micros(start))
+        j = self.rows if end is None else bisect_right(self.timestamps, to_micros(end))
+        return i, j
+
+    def totals(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> tuple[Decimal, Decimal]:
+        i, j = self.index_range(start, end)
+        if (i, j) == (0, self.rows):
+            return self.credit_total, self.debit_total
+        credit = debit = 0
+        for amount, flag in zip(self.amounts[i:j], self.flags[i:j]):
+            if flag == CREDIT:
+                credit += amount
+            else:
+                debit += amount
+        return from_units(credit), from_units(debit)
+
+    def search(self, text: str) -> Iterator[int]:
+        # Scan the heap in place and map each hit back to its row. Strings are
+        # stored back to back, so a hit running past the end of its field is
+        # spread over two strings and not a match.
+        needle = text.encode("utf-8")
+        if not needle:
+            return
+        last_row = -1
+        position = self._mmap.find(needle, self._heap_start)
+        while position != -1:
+            start = position - self._heap_start
+            field = bisect_right(self.offsets, start) - 1
+            row = field // 2
+            if row >= self.rows:
+                break
+            if row != last_row and start + len(needle) <= self.offsets[field + 1]:
+                yield row
+                last_row = row
+            position = self._mmap.find(needle, position + 1)
+
+
+def write_archive(
+    path: str | os.PathLike,
+    records: Iterable[ArchivedRecord],
+    base: RecordArchive | None = None,
+):
+    # Columns are built in compact arrays and the file is swapped in atomically,
+    # so readers of the previous archive never see a half written one
+    timestamps, amounts = array("q"), array("q")
+    offsets, flags = array("Q", [0]), bytearray()
+    heap = bytearray()
+    credit = debit = 0
+    if base is not None:
+        timestamps.frombytes(base.timestamps.tobytes())
+        amounts.frombytes(base.amounts.tobytes())
+        offsets = array("Q")
+        offsets.frombytes(base.offsets.tobytes())
+        flags += base.flags
+        heap += base.heap
+        credit, debit = base._credit_units, base._debit_units
+
+    for record in sorted(records, key=lambda r: r.dateCreated):
+        micros = to_micros(record.dateCreated)
+        if timestamps and micros < timestamps[-1]:
+            raise ValueError("Archived records must not predate the archive's tail")
+        units = to_units(record.amount)
+        timestamps.append(micros)
+        amounts.append(units)
+        flags.append(TYPE_FLAGS[record.type])
+        for value in (record.title, record.description):
+            heap += value.encode("utf-8")
+            offsets.append(len(heap))
+        if record.type == "Credit":
+            credit += units
+        else:
+            debit += units
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + ".tmp")
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(timestamps), credit, debit, len(heap)))
+        f.write(timestamps.tobytes())
+        f.write(amounts.tobytes())
+        f.write(offsets.tobytes())
+        f.write(flags)
+        f.write(heap)
+    os.replace(temp, path)
+
+
+def append_archive(
+    path: str | os.PathLike, records: Iterable[ArchivedRecord]
+) -> RecordArchive:
+    path = Path(path)
+    records = list(records)
+    if not path.exists():
+        write_archive(path, records)
+        return RecordArchive(path)
+
+    # The old mapping has to be closed before it can be replaced on Windows
+    merged = path.with_name(path.name + ".new")
+    base = RecordArchive(path)
+    try:
+        tail = base.last_timestamp
+        if tail is not None and any(to_micros(r.dateCreated) < tail for r in records):
+            # Rare: something older than the archive's tail, rebuild in order
+            write_archive(merged, [*base, *records])
+        else:
+            write_archive(merged, records, base)
+    finally:
+        base.close()
+    os.replace(merged, path)
+    return RecordArchive(path)
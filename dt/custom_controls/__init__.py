@@ -1 +1,2 @@
 from .editable_display_text.editable_display_text import EditableDisplayText
+from .balance_chart.balance_chart import BalanceChart
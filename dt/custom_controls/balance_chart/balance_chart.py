@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime
+
+import flet
+
+from ...history import BalanceHistory
+
+# Resolution of the zoom/pan slider over the whole history span
+SLIDER_STEPS = 1000
+# Seconds between full redraws while balances keep changing
+REDRAW_INTERVAL = 0.5
+
+
+class BalanceChart(flet.Column):
+    def __init__(
+        self,
+        history: BalanceHistory,
+        threshold: int = 300,
+        color: str = flet.colors.PRIMARY_CONTAINER,
+        height: None | int | float = 220,
+        **kwargs,
+    ):
+        super().__init__(spacing=0, height=height, **kwargs)
+        self.history: BalanceHistory = history
+        self.history.subscribe(self.refresh)
+        self.threshold: int = threshold
+        self._drawn_version: int = -1
+        self._drawn_count: int = 0
+        self._redraw: asyncio.TimerHandle | None = None
+
+        self.series = flet.LineChartData(
+            stroke_width=2,
+            color=color,
+            prevent_curve_over_shooting=True,
+        )
+        self.chart = flet.LineChart(
+            data_series=[self.series],
+            left_axis=flet.ChartAxis(labels_size=50),
+            bottom_axis=flet.ChartAxis(show_labels=False),
+            horizontal_grid_lines=flet.ChartGridLines(
+                width=0.5, color=flet.colors.with_opacity(0.2, flet.colors.WHITE)
+            ),
+            tooltip_bgcolor=flet.colors.SECONDARY_CONTAINER,
+            expand=True,
+        )
+        self.range = flet.RangeSlider(
+            start_value=0,
+            end_value=SLIDER_STEPS,
+            min=0,
+            max=SLIDER_STEPS,
+            on_change=self.change_range,
+        )
+        self.rangeText = flet.Text(
+            size=11, color=flet.colors.ON_SECONDARY_CONTAINER, no_wrap=True
+        )
+
+        self.controls = [
+            self.chart,
+            flet.Row([self.rangeText], alignment=flet.MainAxisAlignment.CENTER),
+            self.range,
+        ]
+
+    def did_mount(self):
+        if self._drawn_version != self.history.version:
+            self.redraw()
+            self.update()
+
+    @property
+    def visible_range(self) -> tuple[float, float]:
+        first, last = self.history.span
+        width = last - first
+        return (
+            first + width * self.range.start_value / SLIDER_STEPS,
+            first + width * self.range.end_value / SLIDER_STEPS,
+        )
+
+    def redraw(self):
+        start, end = self.visible_range
+        points = self.history.downsample(start, end, self.threshold)
+        self.series.data_points = [
+            flet.LineChartDataPoint(x, y, tooltip=f"{y:.2f}") for x, y in points
+        ]
+        if points:
+            self.show_range(start, end)
+        self._drawn_version = self.history.version
+        self._drawn_count = len(self.history)
+
+    def show_range(self, start: float, end: float):
+        self.chart.min_x, self.chart.max_x = start, max(end, start + 1)
+        self.rangeText.value = (
+            f"{datetime.fromtimestamp(start):%Y-%m-%d %H:%M}"
+            f" - {datetime.fromtimestamp(end):%Y-%m-%d %H:%M}"
+        )
+
+    def refresh(self, index: int):
+        # New balances only need to be drawn while the chart is on screen
+        if not self.page:
+            return
+        if self.extend(index):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.redraw()
+            return
+        # A full downsample is deferred and shared by every change until it runs
+        if self._redraw is None:
+            self._redraw = loop.call_later(REDRAW_INTERVAL, self.delayed_redraw)
+
+    def extend(self, index: int) -> bool:
+        # Appended points on a whole-history view below the threshold are drawn
+        # as they are, the owner's next update() sends them
+        if (
+            index < self._drawn_count
+            or self._redraw is not None
+            or self.range.start_value != 0
+            or self.range.end_value != SLIDER_STEPS
+            or len(self.history) > self.threshold
+        ):
+            return False
+        self.series.data_points.extend(
+            flet.LineChartDataPoint(x, y, tooltip=f"{y:.2f}")
+            for x, y in zip(
+                self.history.timestamps[self._drawn_count :],
+                self.history.balances[self._drawn_count :],
+            )
+        )
+        self.show_range(*self.visible_range)
+        self._drawn_version = self.history.version
+        self._drawn_count = len(self.history)
+        return True
+
+    def delayed_redraw(self):
+        self._redraw = None
+        if self.page and self._drawn_version != self.history.version:
+            self.redraw()
+            try:
+                self.update()
+            except flet.PageDisconnectedException:
+                pass
+
+    def change_range(self, e):
+        self.redraw()
+        self.update()
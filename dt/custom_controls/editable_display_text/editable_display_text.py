@@ -126,6 +126,12 @@ class EditableDisplayText(flet.Row):
         self.wrapper.content = self.field
         self.update()
 
+    def set_value(self, value: str):
+        # Programmatic change, e.g. from a sync, without the user's on_submit
+        setattr(self.obj, self.value_attribute, value)
+        self.text.value = value
+        self.field.value = value
+
     def change_text(self, e):
         self.action_button.icon = flet.icons.EDIT
         self.action_button.on_click = self.edit_text
@@ -0,0 +1,233 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import weakref
+from asyncio import AbstractEventLoop
+from collections import deque
+from types import FrameType, FunctionType, MethodType, ModuleType
+from typing import Any
+
+import flet
+
+# DT_DIAGNOSTICS=1 tracks tiles and views with weak references, traces
+# allocations and serves a report at /diagnostics. Everything here is a no-op
+# otherwise.
+DIAGNOSTICS = os.getenv("DT_DIAGNOSTICS") == "1"
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 15
+CHAIN_DEPTH = 20
+CHAIN_NODES = 5000
+
+# Shared by every session, reaching one of these ends a walk
+STOP_TYPES = (ModuleType, type, flet.Page, AbstractEventLoop, FrameType)
+
+
+class LeakTracker:
+    def __init__(self):
+        # Keyed by id(), entries drop out when the object is collected
+        self.live: dict[int, tuple[weakref.ref, str]] = {}
+        self.released: dict[int, tuple[weakref.ref, str, float]] = {}
+        self.sessions: dict[str, tuple[weakref.ref, int, float]] = {}
+        self.baseline: tracemalloc.Snapshot | None = None
+
+    def track(self, obj: Any):
+        key = id(obj)
+        self.live[key] = (weakref.ref(obj, lambda r: self._collected(key)), _kind(obj))
+
+    def release(self, obj: Any):
+        # The object is expected to be collected from now on
+        entry = self.live.pop(id(obj), None)
+        if entry is not None:
+            self.released[id(obj)] = (*entry, time.monotonic())
+
+    def _collected(self, key: int):
+        self.live.pop(key, None)
+        self.released.pop(key, None)
+
+    def start_session(self, page: flet.Page):
+        if self.baseline is None:
+            self.baseline = tracemalloc.take_snapshot()
+        self.sessions[page.session_id] = (
+            weakref.ref(page),
+            tracemalloc.get_traced_memory()[0],
+            time.monotonic(),
+        )
+
+    def survivors(self) -> list[tuple[weakref.ref, str, float]]:
+        # Weak references only, so the report doesn't keep anything alive
+        gc.collect()
+        now = time.monotonic()
+        return [
+            (ref, kind, now - released)
+            for ref, kind, released in list(self.released.values())
+            if ref() is not None
+        ]
+
+    def report(self, chains: bool = True) -> dict[str, Any]:
+        roots = {id(ref()) for ref, _ in self.live.values()}
+        leaks = []
+        for ref, kind, age in self.survivors():
+            leaks.append(
+                {
+                    "kind": kind,
+                    "seconds_since_release": round(age, 1),
+                    "chain": referrer_chain(ref, roots) if chains else [],
+                }
+            )
+
+        counts: dict[str, int] = {}
+        for ref, kind in self.live.values():
+            if ref() is not None:
+                counts[kind] = counts.get(kind, 0) + 1
+
+        traced, peak = tracemalloc.get_traced_memory()
+        sessions = []
+        for session_id, (ref, traced_at_start, started) in list(self.sessions.items()):
+            page = ref()
+            if page is None:
+                del self.sessions[session_id]
+                continue
+            objects, size = retained_size([page.views, page.overlay, page.dialog])
+            sessions.append(
+                {
+                    "session": session_id,
+                    "age": round(time.monotonic() - started, 1),
+                    "retained_objects": objects,
+                    "retained_bytes": size,
+                    # Growth of the whole process while this session was open,
+                    # not memory this session allocated
+                    "process_traced_since_start": traced - traced_at_start,
+                }
+            )
+            del page
+
+        return {
+            "leaks": leaks,
+            "live": counts,
+            "sessions": sessions,
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "top_allocations": self.top_allocations(),
+        }
+
+    def top_allocations(self) -> list[str]:
+        if self.baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        stats = snapshot.compare_to(self.baseline, "lineno")
+        return [str(i) for i in stats[:TOP_ALLOCATIONS]]
+
+
+def _kind(obj: Any) -> str:
+    return type(obj).__qualname__
+
+
+def _step(referrer: Any, target: Any) -> str:
+    # Name the attribute, key or index that holds the target where possible
+    if isinstance(referrer, dict):
+        for key, value in referrer.items():
+            if value is target:
+                return f"dict[{key!r}]"
+    elif isinstance(referrer, (list, tuple)):
+        for index, value in enumerate(referrer):
+            if value is target:
+                return f"{_kind(referrer)}[{index}]"
+    elif isinstance(referrer, FunctionType):
+        return f"function {referrer.__qualname__}"
+    elif isinstance(referrer, MethodType):
+        return f"bound method {referrer.__func__.__qualname__}"
+    elif isinstance(referrer, FrameType):
+        return f"frame {referrer.f_code.co_qualname}"
+    return _kind(referrer)
+
+
+def referrer_chain(ref: weakref.ref, roots: set[int]) -> list[str]:
+    # Breadth first over gc referrers, so the shortest path to something that
+    # is meant to be alive is found first. Frames of this call stack only hold
+    # the object because it is being inspected and are skipped.
+    obj = ref()
+    if obj is None:
+        return []
+    module_dicts = {id(vars(i)) for i in list(sys.modules.values()) if i is not None}
+    seen = {id(obj)}
+    frame = sys._getframe()
+    while frame is not None:
+        seen.add(id(frame))
+        frame = frame.f_back
+    queue: deque[tuple[Any, list[str]]] = deque([(obj, [_kind(obj)])])
+    ours = {id(queue)}
+    visited = 0
+    while queue and visited < CHAIN_NODES:
+        target, path = queue.popleft()
+        visited += 1
+        if len(path) > CHAIN_DEPTH:
+            continue
+        for referrer in gc.get_referrers(target):
+            key = id(referrer)
+            if key in seen or key in ours:
+                continue
+            seen.add(key)
+            step = [*path, _step(referrer, target)]
+            if key in roots or key in module_dicts or isinstance(referrer, STOP_TYPES):
+                return step
+            entry = (referrer, step)
+            ours.add(id(entry))
+            queue.append(entry)
+    return [*path, "..."] if queue else path
+
+
+def retained_size(roots: list[Any]) -> tuple[int, int]:
+    # Everything reachable from a session's views, not counting what is shared
+    # between sessions
+    module_dicts = {id(vars(i)) for i in list(sys.modules.values()) if i is not None}
+    seen: set[int] = set()
+    stack = list(roots)
+    size = 0
+    while stack:
+        obj = stack.pop()
+        key = id(obj)
+        if key in seen or key in module_dicts or isinstance(obj, STOP_TYPES):
+            continue
+        seen.add(key)
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return len(seen), size
+
+
+tracker: LeakTracker | None = None
+if DIAGNOSTICS:
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracker = LeakTracker()
+
+
+def track(obj: Any):
+    if tracker is not None:
+        tracker.track(obj)
+
+
+def release(*objs: Any):
+    if tracker is not None:
+        for obj in objs:
+            tracker.release(obj)
+
+
+def start_session(page: flet.Page):
+    if tracker is not None:
+        tracker.start_session(page)
+
+
+def install(app: Any):
+    if tracker is None or app is None:
+        return
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import APIRoute
+
+    async def diagnostics(chains: bool = True):
+        return JSONResponse(tracker.report(chains))
+
+    # Ahead of flet's static files, which are mounted at the root
+    app.router.routes.insert(0, APIRoute("/diagnostics", diagnostics))
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import pickle
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+import flet
+from flet_core.event import Event
+
+from .routing import RouteManager
+
+# Seconds without any event from the browser before a session's controls are
+# dropped and only its serialized state is kept
+HIBERNATE_AFTER = float(os.getenv("DT_HIBERNATE_AFTER", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionHibernator:
+    def __init__(
+        self,
+        page: flet.Page,
+        route_manager: RouteManager,
+        build_view: Callable[[], flet.View],
+        timeout: float = HIBERNATE_AFTER,
+    ):
+        self.page: flet.Page = page
+        self.route_manager: RouteManager = route_manager
+        self.build_view: Callable[[], flet.View] = build_view
+        self.timeout: float = timeout
+
+        self.view: flet.View | None = None
+        self.blob: bytes | None = None
+        self.last_activity: float = time.monotonic()
+        self.closed: bool = False
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+        # Every client event, including reconnects, passes through here
+        handle_event = page.on_event_async
+
+        async def on_event_async(e: Event):
+            if e.name in ("disconnect", "close"):
+                # watch() has to look again, the session may be about to go
+                self.closed = self.closed or e.name == "close"
+                self._wake.set()
+            else:
+                self.last_activity = time.monotonic()
+                if self.blob is not None:
+                    await self.rehydrate()
+            await handle_event(e)
+
+        page.on_event_async = on_event_async
+
+    @property
+    def hibernating(self) -> bool:
+        return self.blob is not None
+
+    def start(self, view: flet.View):
+        self.view = view
+        self._task = asyncio.create_task(self.watch())
+
+    async def watch(self):
+        # Expired sessions are closed by flet, which drops the connection
+        while self.page.connection is not None and not self.closed:
+            self._wake.clear()
+            idle = time.monotonic() - self.last_activity
+            if idle >= self.timeout and not self.hibernating:
+                await self.hibernate()
+                idle = 0
+            wait = max(self.timeout - idle, 1)
+            if self.page.expires_at is not None:
+                expires = self.page.expires_at - datetime.now(timezone.utc)
+                wait = min(wait, max(expires.total_seconds(), 0) + 1)
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except TimeoutError:
+                pass
+        self.close()
+
+    def close(self):
+        # Nothing is kept for a session that is gone
+        self.blob = None
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+
+    async def hibernate(self):
+        async with self._lock:
+            if self.hibernating or self.view is None:
+                return
+            start = time.perf_counter()
+            state: dict[str, Any] = self.view.to_state()
+            self.blob = zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), 1)
+            self.view.release()
+            self.view = None
+            self.route_manager.clear()
+            # Dialogs and overlays hold handlers into the dropped controls
+            if self.page.dialog is not None:
+                self.page.dialog.open = False
+                self.page.dialog = None
+            self.page.overlay.clear()
+            self.page.views.clear()
+            self.page.views.append(
+                flet.View(
+                    "/",
+                    [
+                        flet.Container(
+                            flet.Text("Session paused, tap to resume"),
+                            alignment=flet.alignment.center,
+                            expand=True,
+                            on_click=lambda e: None,
+                        )
+                    ],
+                    bgcolor=flet.colors.BACKGROUND,
+                )
+            )
+            try:
+                self.page.update()
+            except flet.PageDisconnectedException:
+                pass
+            logger.info(
+                f"Hibernated session {self.page.session_id}: {len(self.blob)} bytes"
+                f" in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+
+    async def rehydrate(self):
+        async with self._lock:
+            if not self.hibernating:
+                return
+            start = time.perf_counter()
+            state: dict[str, Any] = pickle.loads(zlib.decompress(self.blob))
+            self.blob = None
+            self.view = self.build_view()
+            self.view.restore(state)
+            # Keep the route the browser reconnected with if it still exists
+            if self.page.route not in self.route_manager.routes:
+                self.page.route = state["route"]
+            await self.route_manager.on_route_change(None)
+            self.view.restore_scroll(state)
+            logger.info(
+                f"Rehydrated session {self.page.session_id}"
+                f" in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
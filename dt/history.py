@@ -0,0 +1,174 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Sequence
+
+# Raw points are summarised in fixed blocks so a zoomed-out view never has to
+# scan the whole history, and an append only ever touches the last block.
+BLOCK_SIZE = 256
+
+
+def lttb(
+    xs: Sequence[float], ys: Sequence[float], threshold: int
+) -> list[tuple[float, float]]:
+    # Largest-Triangle-Three-Buckets, keeps first and last point
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(zip(xs, ys))
+
+    sampled = [(xs[0], ys[0])]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(xs[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(ys[avg_start:avg_end]) / (avg_end - avg_start)
+
+        ax, ay = xs[a], ys[a]
+        max_area, next_a = -1.0, a
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area, next_a = area, j
+        sampled.append((xs[next_a], ys[next_a]))
+        a = next_a
+    sampled.append((xs[-1], ys[-1]))
+    return sampled
+
+
+class BalanceHistory:
+    def __init__(self):
+        self.timestamps: list[float] = []
+        self.balances: list[float] = []
+        # (index of min, index of max) for every BLOCK_SIZE raw points
+        self.blocks: list[tuple[int, int]] = []
+        self.version: int = 0
+        # Called with the index of the first point that changed
+        self.listeners: list[Callable[[int], None]] = []
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def last(self) -> float:
+        return self.balances[-1] if self.balances else 0.0
+
+    @property
+    def span(self) -> tuple[float, float]:
+        if not self.timestamps:
+            return (0.0, 0.0)
+        return (self.timestamps[0], self.timestamps[-1])
+
+    def subscribe(self, listener: Callable[[int], None]):
+        self.listeners.append(listener)
+
+    def _changed(self, index: int):
+        self.version += 1
+        for listener in self.listeners:
+            listener(index)
+
+    def _block(self, index: int):
+        if index % BLOCK_SIZE == 0:
+            self.blocks.append((index, index))
+        else:
+            lo, hi = self.blocks[-1]
+            if self.balances[index] < self.balances[lo]:
+                lo = index
+            if self.balances[index] > self.balances[hi]:
+                hi = index
+            self.blocks[-1] = (lo, hi)
+
+    def add(self, timestamp: float, delta: float):
+        self.add_many([(timestamp, delta)])
+
+    def add_many(self, changes: list[tuple[float, float]]):
+        changes = sorted(i for i in changes if i[1])
+        if not changes:
+            return
+        if not self.timestamps or changes[0][0] >= self.timestamps[-1]:
+            index = len(self.timestamps)
+            for timestamp, delta in changes:
+                self.timestamps.append(timestamp)
+                self.balances.append(self.last + delta)
+                self._block(len(self.timestamps) - 1)
+            self._changed(index)
+            return
+
+        # Backdated changes, e.g. a synced or moved record, are merged in at
+        # their time and shift every later balance
+        index = bisect_right(self.timestamps, changes[0][0])
+        timestamps, balances = self.timestamps[:index], self.balances[:index]
+        shift = 0.0
+        k = 0
+        for i in range(index, len(self.timestamps)):
+            while k < len(changes) and changes[k][0] < self.timestamps[i]:
+                shift += changes[k][1]
+                timestamps.append(changes[k][0])
+                balances.append((balances[-1] if balances else 0.0) + changes[k][1])
+                k += 1
+            timestamps.append(self.timestamps[i])
+            balances.append(self.balances[i] + shift)
+        for timestamp, delta in changes[k:]:
+            timestamps.append(timestamp)
+            balances.append((balances[-1] if balances else 0.0) + delta)
+        self.timestamps, self.balances = timestamps, balances
+
+        first_block = index // BLOCK_SIZE
+        del self.blocks[first_block:]
+        for i in range(first_block * BLOCK_SIZE, len(self.timestamps)):
+            self._block(i)
+        self._changed(index)
+
+    def to_state(self) -> dict[str, Any]:
+        # Packed arrays keep a hibernated history small and quick to restore
+        return {
+            "timestamps": array("d", self.timestamps),
+            "balances": array("d", self.balances),
+            "blocks": array("q", [i for block in self.blocks for i in block]),
+        }
+
+    def restore(self, state: dict[str, Any]):
+        self.timestamps = state["timestamps"].tolist()
+        self.balances = state["balances"].tolist()
+        blocks = state["blocks"].tolist()
+        self.blocks = list(zip(blocks[::2], blocks[1::2]))
+        self._changed(0)
+
+    def downsample(
+        self, start: float | None = None, end: float | None = None, threshold: int = 300
+    ) -> list[tuple[float, float]]:
+        i = 0 if start is None else bisect_left(self.timestamps, start)
+        j = len(self) if end is None else bisect_right(self.timestamps, end)
+        if j - i <= threshold:
+            return list(zip(self.timestamps[i:j], self.balances[i:j]))
+
+        buckets = max(threshold // 2, 1)
+        if (j - i) / buckets < BLOCK_SIZE:
+            return lttb(self.timestamps[i:j], self.balances[i:j], threshold)
+        return self._min_max(i, j, buckets)
+
+    def _min_max(self, i: int, j: int, buckets: int) -> list[tuple[float, float]]:
+        # Min/max bucketing over whole blocks, scanning raw points only at the
+        # ragged edges of each bucket
+        points: list[tuple[float, float]] = []
+        width = (j - i) / buckets
+        for b in range(buckets):
+            lo = i + int(b * width)
+            hi = i + int((b + 1) * width) if b < buckets - 1 else j
+            candidates: list[int] = []
+            first_block = -(-lo // BLOCK_SIZE)
+            last_block = hi // BLOCK_SIZE
+            if first_block < last_block:
+                candidates.extend(range(lo, first_block * BLOCK_SIZE))
+                for block in self.blocks[first_block:last_block]:
+                    candidates.extend(block)
+                candidates.extend(range(last_block * BLOCK_SIZE, hi))
+            else:
+                candidates.extend(range(lo, hi))
+            if not candidates:
+                continue
+            low = min(candidates, key=self.balances.__getitem__)
+            high = max(candidates, key=self.balances.__getitem__)
+            for k in sorted({low, high}):
+                points.append((self.timestamps[k], self.balances[k]))
+        return points
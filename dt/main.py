@@ -1,20 +1,82 @@
 import asyncio
 import logging
-from datetime import datetime
-from decimal import Decimal
-from typing import Callable, Literal
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Callable, Iterator, Literal
 from uuid import UUID, uuid4
 
 import flet
 from flet.fastapi.flet_fastapi import FastAPI
 
-from .custom_controls import EditableDisplayText
+from . import diagnostics, sync
+from .archive import (
+    AMOUNT_SCALE,
+    ArchivedRecord,
+    RecordArchive,
+    append_archive,
+    to_units,
+)
+from .custom_controls import BalanceChart, EditableDisplayText
+from .hibernation import SessionHibernator
+from .history import BalanceHistory
 from .routing import RouteManager
+from .statements import CHUNK_SIZE, generate_statements, signed
+from .sync import (
+    PERSON_BUCKET,
+    HttpPeer,
+    Peer,
+    Replica,
+    ReplicaStore,
+    reconcile,
+)
+from .totals import GlobalTotals
 
 logging.basicConfig(level=logging.INFO)
 
 ALPHABETS_WITH_SPACE_RE = r"[a-zA-Z ]"
 DECIMALS_RE = r"[0-9.]"
+DATES_RE = r"[0-9-]"
+
+# Records older than this can be moved out of memory into the person's archive
+ARCHIVE_AFTER = timedelta(days=int(os.getenv("DT_ARCHIVE_AFTER_DAYS", "90")))
+ARCHIVE_DIR = Path(os.getenv("DT_ARCHIVE_DIR", "archive"))
+ARCHIVE_PAGE_SIZE = 50
+SEARCH_LIMIT = 50
+
+# DT_SYNC_PATH keeps the central replica on this server, logged to that file,
+# and serves it at /sync. DT_SYNC_URL syncs with one served by another server
+# instead. Sync is off when neither is set.
+SYNC_PATH = os.getenv("DT_SYNC_PATH")
+SYNC_URL = os.getenv("DT_SYNC_URL")
+# Shared secret /sync asks for, and HttpPeer sends
+SYNC_TOKEN = os.getenv("DT_SYNC_TOKEN")
+
+STATEMENTS_DIR = Path(os.getenv("DT_STATEMENTS_DIR", "statements"))
+
+# People listed under each side of the dashboard
+TOP_PEOPLE = 3
+# Seconds the dashboard waits for more balance changes before redrawing
+TOTALS_INTERVAL = 0.5
+
+
+def parse_amount(text: str) -> Decimal | None:
+    # Archives keep amounts to AMOUNT_SCALE decimal places, anything finer
+    # couldn't be archived later
+    try:
+        amount = Decimal(text)
+        to_units(amount)
+    except (InvalidOperation, ValueError):
+        return None
+    return amount
+
+
+def dismiss_dialog(page: flet.Page):
+    # A closed dialog stays on the page until it is replaced, and with it the
+    # handlers holding on to whoever opened it
+    page.close_dialog()
+    page.dialog = None
 
 
 class RecordTile(flet.Stack):
@@ -25,9 +87,12 @@ class RecordTile(flet.Stack):
         title: str,
         description: str,
         amount: Decimal,
+        id: UUID | None = None,
+        date_created: datetime | None = None,
     ):
         super().__init__()
         self.view = view
+        self.id: UUID = id or uuid4()
         self._type: Literal["Credit"] | Literal["Debit"] = type
 
         self.title: str = title
@@ -44,6 +109,7 @@ class RecordTile(flet.Stack):
             field=flet.TextField(
                 autofocus=True,
                 input_filter=flet.InputFilter(ALPHABETS_WITH_SPACE_RE),
+                on_submit=self.touch,
             ),
             wrapper=flet.Container(
                 padding=5,
@@ -64,13 +130,17 @@ class RecordTile(flet.Stack):
             value_attribute="description",
             field_size=12,
             text=self._descriptionText,
-            field=flet.TextField(multiline=True, autofocus=True),
+            field=flet.TextField(multiline=True, autofocus=True, on_submit=self.touch),
             wrapper=flet.Container(expand=True),
         )
 
-        self.dateCreated: datetime = datetime.now()
+        self.dateCreated: datetime = date_created or datetime.now()
         self.dateCreatedText = flet.Text(str(self.dateCreated))
 
+        self.checkbox = flet.Checkbox(
+            visible=False, on_change=lambda e: self.view.update_selection()
+        )
+
         self.amountText = flet.Text("Amount: ", color=flet.colors.ON_TERTIARY_CONTAINER)
         self.amount: Decimal = amount
 
@@ -143,12 +213,21 @@ class RecordTile(flet.Stack):
                     height=168,
                 )
             ),
+            flet.TransparentPointer(
+                flet.Container(
+                    content=self.checkbox,
+                    alignment=flet.alignment.top_right,
+                    expand=True,
+                    height=170,
+                )
+            ),
         ]
 
         if self._type == "Credit":
             self.card.color = "#78d679"
         else:
             self.card.color = "#ff8597"
+        diagnostics.track(self)
 
     @property
     def amount(self):
@@ -158,12 +237,14 @@ class RecordTile(flet.Stack):
     def amount(self, val: Decimal):
         if not hasattr(self, "_amount"):
             self._amount = Decimal(0)
-        if self._type == "Credit":
-            self.view.parent_tile.money_they_owe -= self._amount
-            self.view.parent_tile.money_they_owe += val
-        elif self._type == "Debit":
-            self.view.parent_tile.money_you_owe -= self._amount
-            self.view.parent_tile.money_you_owe += val
+        # Apply as a single delta so the balance history gets one point, at the
+        # time the record was created
+        delta = val - self._amount
+        self.view.parent_tile.adjust_balance(
+            delta if self._type == "Credit" else Decimal(0),
+            delta if self._type == "Debit" else Decimal(0),
+            [(self.dateCreated, delta if self._type == "Debit" else -delta)],
+        )
         self._amount: Decimal = val
         self.amountText.value = "Amount: " + str(self._amount)
         if self.page:
@@ -176,20 +257,150 @@ class RecordTile(flet.Stack):
 
     @dateCreated.setter
     def dateCreated(self, val: datetime):
+        if hasattr(self, "_amount") and val != self._dateCreated:
+            # Moves this record's point in the balance history
+            self.view.parent_tile.adjust_balance(
+                Decimal(0),
+                Decimal(0),
+                [(self._dateCreated, -self.net), (val, self.net)],
+            )
         self._dateCreated = val
         if hasattr(self, "dateCreatedText"):
-            self.dateCreatedTex.valuet = str(val)
+            self.dateCreatedText.value = str(val)
         self.view.parent_tile.lastTransaction = val
 
     async def remove_self(self, e):
         self.amount = 0
         await self.parent.remove_record(self)
 
+    def set_type(self, type: Literal["Credit", "Debit"]):
+        if type == self._type:
+            return
+        amount = self.amount
+        self.amount = Decimal(0)
+        self.retype(type)
+        self.amount = amount
+
+    @property
+    def net(self) -> Decimal:
+        # What this record adds to the person's net_owed
+        return self.amount if self._type == "Debit" else -self.amount
+
+    def retype(self, type: Literal["Credit", "Debit"]):
+        # Only relabels the record, the caller settles the balances
+        self._type = type
+        self.card.color = "#78d679" if type == "Credit" else "#ff8597"
+
+    def touch(self):
+        # Staged on the next sync
+        self.view.records.dirty.add(self)
+        self.view.parent_tile.touch()
+
+    def archived(self) -> ArchivedRecord:
+        return ArchivedRecord(
+            self._type, self.title, self.description, self.amount, self.dateCreated
+        )
+
+    @property
+    def bucket(self) -> str:
+        # Synced records are grouped by the month they were created in
+        return f"{self.dateCreated:%Y-%m}"
+
+    def sync_data(self) -> dict[str, Any]:
+        return {
+            "type": self._type,
+            "title": self.title,
+            "description": self.description,
+            "amount": str(self.amount),
+            "dateCreated": self.dateCreated.isoformat(),
+        }
+
+    def apply_sync_data(self, data: dict[str, Any]):
+        self.titleText.set_value(data["title"])
+        self.descriptionText.set_value(data["description"])
+        self.set_type(data["type"])
+        if self.amount != Decimal(data["amount"]):
+            self.amount = Decimal(data["amount"])
+        self.dateCreated = datetime.fromisoformat(data["dateCreated"])
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "type": self._type,
+            "title": self.title,
+            "description": self.description,
+            "amount": self.amount,
+            "dateCreated": self.dateCreated,
+            "lastUpdated": self.lastUpdated,
+        }
+
+
+class ArchivedRecordTile(flet.Card):
+    def __init__(self, record: ArchivedRecord):
+        super().__init__(
+            color="#78d679" if record.type == "Credit" else "#ff8597",
+            margin=10,
+        )
+        self.record: ArchivedRecord = record
+        self.content = flet.Container(
+            flet.Column(
+                [
+                    flet.Text(
+                        record.title,
+                        theme_style=flet.TextThemeStyle.BODY_LARGE,
+                        no_wrap=True,
+                    ),
+                    flet.Text(
+                        record.description,
+                        theme_style=flet.TextThemeStyle.BODY_MEDIUM,
+                        color=flet.colors.ON_TERTIARY_CONTAINER,
+                    ),
+                    flet.Row(
+                        [
+                            flet.Text("Amount: " + str(record.amount)),
+                            flet.Text(str(record.dateCreated)),
+                        ],
+                        alignment=flet.MainAxisAlignment.SPACE_BETWEEN,
+                    ),
+                ],
+                spacing=5,
+            ),
+            padding=10,
+        )
+
 
 class RecordList(flet.ListView):
     def __init__(self, parent):
-        super().__init__(spacing=20, padding=10, expand=True)
+        super().__init__(
+            spacing=20,
+            padding=10,
+            expand=True,
+            on_scroll_interval=250,
+            on_scroll=self.track_scroll,
+        )
         self.parent = parent
+        self.scroll_offset: float = 0
+        self.selecting: bool = False
+        # Edited, removed or archived since the last sync, staged into the
+        # replica by NameList.stage
+        self.dirty: set[RecordTile] = set()
+        self.deleted_ids: set[UUID] = set()
+        # The tiles are gone by then, so their bucket and data are kept
+        self.archived: dict[UUID, tuple[str, dict[str, Any]]] = {}
+        # Every record in the archive, so a sync doesn't add one twice
+        self.in_archive: set[UUID] = set()
+
+        self.archive: RecordArchive | None = None
+        # Each session archives into a file of its own, sessions syncing the
+        # same person would otherwise write over each other's
+        self.archive_path: Path = ARCHIVE_DIR / f"{uuid4()}.dtarc"
+        self.archived_shown: int = 0
+        self.archiveButton = flet.TextButton(
+            icon=flet.icons.ARCHIVE,
+            on_click=lambda e: self.page.run_task(self.show_archived),
+            visible=False,
+        )
+        self.controls.append(self.archiveButton)
         # self.controls.append(
         #     RecordTile(
         #         self.parent,
@@ -217,10 +428,11 @@ class RecordList(flet.ListView):
             )
             self.page.update()
 
-            await func(self, *args, **kwargs)
-
-            self.page.overlay.clear()
-            self.page.update()
+            try:
+                await func(self, *args, **kwargs)
+            finally:
+                self.page.overlay.clear()
+                self.page.update()
 
         return add_loading
 
@@ -235,6 +447,7 @@ class RecordList(flet.ListView):
         self.auto_scroll = True
         tile = RecordTile(self.parent, type, title, description, amount)
         self.controls.append(tile)
+        tile.touch()
         self.parent.update()
         self.auto_scroll = False
         await asyncio.sleep(0.25)
@@ -242,10 +455,260 @@ class RecordList(flet.ListView):
     @loading_animation
     async def remove_record(self, tile: RecordTile):
         self.controls.remove(tile)
+        self.dirty.discard(tile)
+        self.deleted_ids.add(tile.id)
+        self.parent.parent_tile.touch()
+        diagnostics.release(tile)
         del tile
         self.parent.update()
         await asyncio.sleep(0.25)
 
+    def selected_records(self) -> list[RecordTile]:
+        return [
+            i for i in self.controls if isinstance(i, RecordTile) and i.checkbox.value
+        ]
+
+    def set_selecting(self, selecting: bool, value: bool = False):
+        self.selecting = selecting
+        for i in self.controls:
+            if isinstance(i, RecordTile):
+                i.checkbox.visible = selecting
+                i.checkbox.value = value
+        self.parent.show_selection(selecting)
+        if self.parent.page:
+            self.parent.update()
+
+    def take_selected(self) -> tuple[list[RecordTile], Decimal, Decimal]:
+        tiles = self.selected_records()
+        ids = {i.id for i in tiles}
+        self.controls = [
+            i for i in self.controls if not isinstance(i, RecordTile) or i.id not in ids
+        ]
+        self.dirty.difference_update(tiles)
+        credit = sum((i.amount for i in tiles if i._type == "Credit"), Decimal(0))
+        debit = sum((i.amount for i in tiles if i._type == "Debit"), Decimal(0))
+        self.parent.parent_tile.adjust_balance(
+            -credit, -debit, [(i.dateCreated, -i.net) for i in tiles]
+        )
+        return tiles, credit, debit
+
+    # Batch edits settle each person's balance once and update the screen once,
+    # however many records are selected
+
+    def remove_selected(self):
+        tiles, _, _ = self.take_selected()
+        self.deleted_ids.update(i.id for i in tiles)
+        self.parent.parent_tile.touch()
+        diagnostics.release(*tiles)
+        self.finish_batch()
+
+    def retype_selected(self):
+        credit = debit = Decimal(0)
+        changes = []
+        for i in self.selected_records():
+            changes.append((i.dateCreated, -2 * i.net))
+            i.touch()
+            if i._type == "Credit":
+                credit, debit = credit - i.amount, debit + i.amount
+                i.retype("Debit")
+            else:
+                credit, debit = credit + i.amount, debit - i.amount
+                i.retype("Credit")
+        self.parent.parent_tile.adjust_balance(credit, debit, changes)
+        self.finish_batch()
+
+    def move_selected(self, target: "NameTile"):
+        tiles, credit, debit = self.take_selected()
+        # Ids are kept, so syncing sees a move rather than a delete and an add
+        for i in tiles:
+            i.view = target.view
+            i.checkbox.visible = target.view.records.selecting
+            i.checkbox.value = False
+            i.touch()
+        target.view.records.controls.extend(tiles)
+        target.adjust_balance(credit, debit, [(i.dateCreated, i.net) for i in tiles])
+        latest = max((i.dateCreated for i in tiles), default=None)
+        if latest is not None and (
+            not isinstance(target.lastTransaction, datetime)
+            or latest > target.lastTransaction
+        ):
+            target.lastTransaction = latest
+        self.finish_batch()
+        if target.page:
+            target.update()
+
+    def finish_batch(self):
+        self.set_selecting(False)
+        if self.parent.parent_tile.page:
+            self.parent.parent_tile.update()
+
+    def update_archive_button(self):
+        remaining = len(self.archive) - self.archived_shown if self.archive else 0
+        self.archiveButton.text = f"Show older archived records ({remaining})"
+        self.archiveButton.visible = remaining > 0
+
+    def load_archive(self):
+        # Only the header is read, rows stay on disk until they are shown
+        if self.archive is not None or not self.archive_path.exists():
+            return
+        self.archive = RecordArchive(self.archive_path)
+        self.parent.parent_tile.money_they_owe += self.archive.credit_total
+        self.parent.parent_tile.money_you_owe += self.archive.debit_total
+        self.update_archive_button()
+
+    @loading_animation
+    async def archive_old_records(self):
+        if self.archive_before(datetime.now() - ARCHIVE_AFTER):
+            self.parent.update()
+
+    def archive_before(self, cutoff: datetime) -> bool:
+        old = [
+            i
+            for i in self.controls
+            if isinstance(i, RecordTile) and i.dateCreated < cutoff
+        ]
+        if not old:
+            return False
+        # Other replicas must not bring them back as live records
+        self.archived.update({i.id: (i.bucket, i.sync_data()) for i in old})
+        self.parent.parent_tile.touch()
+        self.add_to_archive(old)
+        return True
+
+    def add_to_archive(
+        self, tiles: list[RecordTile], records: list[ArchivedRecord] | None = None
+    ):
+        # Balances already include these records, they only leave memory
+        if self.archive is not None:
+            self.archive.close()
+        self.archive = append_archive(
+            self.archive_path, [*(i.archived() for i in tiles), *(records or [])]
+        )
+        diagnostics.release(*tiles)
+        self.in_archive.update(i.id for i in tiles)
+        tiles = set(tiles)
+        self.dirty -= tiles
+        self.controls = [
+            i
+            for i in self.controls
+            if i not in tiles and not isinstance(i, ArchivedRecordTile)
+        ]
+        self.archived_shown = 0
+        self.update_archive_button()
+
+    def search(self, text: str) -> list[ArchivedRecord]:
+        # Newest live records first, then the archive, which is scanned on disk
+        found = [
+            i.archived()
+            for i in reversed(self.controls)
+            if isinstance(i, RecordTile) and (text in i.title or text in i.description)
+        ][:SEARCH_LIMIT]
+        if self.archive is not None:
+            for row in self.archive.search(text):
+                if len(found) >= SEARCH_LIMIT:
+                    break
+                found.append(self.archive[row])
+        return found
+
+    def track_scroll(self, e: flet.OnScrollEvent):
+        self.scroll_offset = e.pixels
+
+    def to_state(self) -> list[dict[str, Any]]:
+        return [i.to_state() for i in self.controls if isinstance(i, RecordTile)]
+
+    def restore(self, records: list[dict[str, Any]]):
+        for i in records:
+            tile = RecordTile(
+                self.parent,
+                i["type"],
+                i["title"],
+                i["description"],
+                i["amount"],
+                i["id"],
+                i["dateCreated"],
+            )
+            tile.lastUpdated = i["lastUpdated"]
+            self.controls.append(tile)
+        self.load_archive()
+
+    def release(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def delete_archive(self):
+        # For a person who was removed, sync tombstones already cover the
+        # records it held
+        self.release()
+        self.archive_path.unlink(missing_ok=True)
+
+    def apply_sync(self, replica: Replica, entries: list[dict[str, Any]]):
+        person = str(self.parent.parent_tile.id)
+        live = {str(i.id): i for i in self.controls if isinstance(i, RecordTile)}
+        # Drop records deleted elsewhere or moved to another person
+        for id, tile in live.items():
+            entry = replica.entries.get(id)
+            if entry is not None and (entry["deleted"] or entry["person"] != person):
+                tile.amount = Decimal(0)
+                self.controls.remove(tile)
+                self.dirty.discard(tile)
+                diagnostics.release(tile)
+        # Archived elsewhere: live ones move into this session's archive as
+        # they are, ones not seen here are added to it and counted
+        moved: list[RecordTile] = []
+        pulled: list[ArchivedRecord] = []
+        for entry in entries:
+            if entry["deleted"] or UUID(entry["id"]) in self.in_archive:
+                continue
+            data = entry["data"]
+            if entry["id"] in live:
+                live[entry["id"]].apply_sync_data(data)
+                if entry["archived"]:
+                    moved.append(live[entry["id"]])
+                continue
+            if entry["archived"]:
+                pulled.append(
+                    ArchivedRecord(
+                        data["type"],
+                        data["title"],
+                        data["description"],
+                        Decimal(data["amount"]),
+                        datetime.fromisoformat(data["dateCreated"]),
+                    )
+                )
+                self.in_archive.add(UUID(entry["id"]))
+                continue
+            tile = RecordTile(
+                self.parent,
+                data["type"],
+                data["title"],
+                data["description"],
+                Decimal(data["amount"]),
+                UUID(entry["id"]),
+                datetime.fromisoformat(data["dateCreated"]),
+            )
+            self.controls.append(tile)
+        if not moved and not pulled:
+            return
+        self.parent.parent_tile.adjust_balance(
+            sum((i.amount for i in pulled if i.type == "Credit"), Decimal(0)),
+            sum((i.amount for i in pulled if i.type == "Debit"), Decimal(0)),
+            [(i.dateCreated, signed(i.type, i.amount)) for i in pulled],
+        )
+        self.add_to_archive(moved, pulled)
+
+    @loading_animation
+    async def show_archived(self):
+        stop = len(self.archive) - self.archived_shown
+        start = max(stop - ARCHIVE_PAGE_SIZE, 0)
+        index = self.controls.index(self.archiveButton) + 1
+        self.controls[index:index] = [
+            ArchivedRecordTile(i) for i in self.archive.page(start, stop)
+        ]
+        self.archived_shown += stop - start
+        self.update_archive_button()
+        self.parent.update()
+
 
 class RecordView(flet.View):
     def __init__(
@@ -265,6 +728,7 @@ class RecordView(flet.View):
 
         self.parent_tile = parent_tile
 
+        self.chart = BalanceChart(self.parent_tile.history)
         self.records = RecordList(self)
         self.credit_button = flet.ElevatedButton(
             "Credit",
@@ -282,22 +746,147 @@ class RecordView(flet.View):
             on_click=self.add_debit,
             expand=True,
         )
+        self.actionBar = flet.Container(
+            content=flet.Row(
+                [
+                    self.credit_button,
+                    self.debit_button,
+                ],
+            ),
+            bgcolor=flet.colors.SECONDARY_CONTAINER,
+            padding=10,
+            height=50,
+            border_radius=20,
+        )
+
+        self.selectionText = flet.Text(color=flet.colors.ON_SECONDARY_CONTAINER)
+        self.selectionBar = flet.Container(
+            content=flet.Row(
+                [
+                    self.selectionText,
+                    flet.TextButton(
+                        "All", on_click=lambda e: self.records.set_selecting(True, True)
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.DELETE,
+                        tooltip="Delete",
+                        on_click=lambda e: self.records.remove_selected(),
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.SWAP_HORIZ,
+                        tooltip="Swap Credit and Debit",
+                        on_click=lambda e: self.records.retype_selected(),
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.DRIVE_FILE_MOVE,
+                        tooltip="Move to",
+                        on_click=self.ask_move,
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.CLOSE,
+                        tooltip="Done",
+                        on_click=lambda e: self.records.set_selecting(False),
+                    ),
+                ],
+                alignment=flet.MainAxisAlignment.SPACE_BETWEEN,
+            ),
+            bgcolor=flet.colors.SECONDARY_CONTAINER,
+            padding=flet.padding.symmetric(horizontal=10),
+            height=50,
+            border_radius=20,
+            visible=False,
+        )
+        if self.appbar is not None:
+            self.appbar.actions.append(
+                flet.IconButton(
+                    icon=flet.icons.SEARCH,
+                    tooltip="Search records",
+                    on_click=self.ask_search,
+                )
+            )
+            self.appbar.actions.append(
+                flet.IconButton(
+                    icon=flet.icons.CHECKLIST,
+                    tooltip="Select",
+                    on_click=lambda e: self.records.set_selecting(
+                        not self.records.selecting
+                    ),
+                )
+            )
 
         self.controls = [
+            self.chart,
             self.records,
-            flet.Container(
-                content=flet.Row(
-                    [
-                        self.credit_button,
-                        self.debit_button,
-                    ],
-                ),
-                bgcolor=flet.colors.SECONDARY_CONTAINER,
-                padding=10,
-                height=50,
-                border_radius=20,
-            ),
+            self.actionBar,
+            self.selectionBar,
+        ]
+        diagnostics.track(self)
+
+    def show_selection(self, selecting: bool):
+        self.actionBar.visible = not selecting
+        self.selectionBar.visible = selecting
+        self.selectionText.value = f"{len(self.records.selected_records())} selected"
+
+    def update_selection(self):
+        self.selectionText.value = f"{len(self.records.selected_records())} selected"
+        self.selectionText.update()
+
+    def ask_move(self, e):
+        people = [
+            i for i in self.parent_tile.parent.controls if i is not self.parent_tile
         ]
+        if not people or not self.records.selected_records():
+            return
+        target = flet.Dropdown(
+            label="Person",
+            options=[flet.dropdown.Option(str(i.id), i.name) for i in people],
+            autofocus=True,
+        )
+
+        async def move(e):
+            tile = next((i for i in people if str(i.id) == target.value), None)
+            if tile is not None:
+                dismiss_dialog(self.page)
+                self.records.move_selected(tile)
+
+        dlg_modal = flet.AlertDialog(
+            title=flet.Text("Move Records to"),
+            content=target,
+            actions=[flet.TextButton("Confirm", on_click=move)],
+            actions_alignment=flet.MainAxisAlignment.END,
+            open=True,
+        )
+        self.page.dialog = dlg_modal
+        self.page.update()
+
+    def ask_search(self, e):
+        text = flet.TextField(label="Title or Description", autofocus=True)
+        results = flet.Column(scroll=flet.ScrollMode.AUTO, visible=False)
+
+        async def search(e):
+            if not (i := text.value.strip()):
+                return
+            found = self.records.search(i)
+            results.controls = [ArchivedRecordTile(j) for j in found] or [
+                flet.Text("No matching records")
+            ]
+            results.height = 400 if found else None
+            results.visible = True
+            self.page.update()
+
+        text.on_submit = search
+        dlg_modal = flet.AlertDialog(
+            title=flet.Text("Search Records"),
+            content=flet.Column([text, results], tight=True, width=500),
+            actions=[
+                flet.TextButton("Search", on_click=search),
+                flet.TextButton("Close", on_click=lambda e: dismiss_dialog(self.page)),
+            ],
+            actions_alignment=flet.MainAxisAlignment.END,
+            open=True,
+        )
+        self.page.dialog = dlg_modal
+        self.page.update()
 
     def add_credit(self, e):
         title = flet.TextField(
@@ -322,9 +911,13 @@ class RecordView(flet.View):
                     k := amount.value.strip(),
                 )
             ):
-                self.page.close_dialog()
+                if (value := parse_amount(k)) is None:
+                    amount.error_text = f"A number with up to {AMOUNT_SCALE} decimals"
+                    amount.update()
+                    return
+                dismiss_dialog(self.page)
                 await self.records.add_record(
-                    type="Credit", title=i, description=j, amount=Decimal(k)
+                    type="Credit", title=i, description=j, amount=value
                 )
 
         dlg_modal = flet.AlertDialog(
@@ -360,9 +953,13 @@ class RecordView(flet.View):
                     k := amount.value.strip(),
                 )
             ):
-                self.page.close_dialog()
+                if (value := parse_amount(k)) is None:
+                    amount.error_text = f"A number with up to {AMOUNT_SCALE} decimals"
+                    amount.update()
+                    return
+                dismiss_dialog(self.page)
                 await self.records.add_record(
-                    type="Debit", title=i, description=j, amount=Decimal(k)
+                    type="Debit", title=i, description=j, amount=value
                 )
 
         dlg_modal = flet.AlertDialog(
@@ -377,7 +974,14 @@ class RecordView(flet.View):
 
 
 class NameTile(flet.Card):
-    def __init__(self, name="Anon"):
+    def __init__(
+        self,
+        name="Anon",
+        global_history: BalanceHistory | None = None,
+        id: UUID | None = None,
+        totals: GlobalTotals | None = None,
+        dirty: set[UUID] | None = None,
+    ):
         super().__init__(color=flet.colors.ON_INVERSE_SURFACE)
         self.content = flet.Container(
             flet.ResponsiveRow(
@@ -388,7 +992,9 @@ class NameTile(flet.Card):
             on_click=self.show_details,
         )
 
-        self.id: UUID = uuid4()
+        self.id: UUID = id or uuid4()
+        # People to stage on the next sync, shared with the NameList
+        self.dirty: set[UUID] | None = dirty
 
         self.name: str = name
         self._nameTitle = flet.Text(
@@ -404,6 +1010,7 @@ class NameTile(flet.Card):
             field=flet.TextField(
                 autofocus=True,
                 input_filter=flet.InputFilter(ALPHABETS_WITH_SPACE_RE),
+                on_submit=self.rename,
             ),
             wrapper=flet.Container(
                 padding=flet.padding.only(left=35), alignment=flet.alignment.center
@@ -449,6 +1056,9 @@ class NameTile(flet.Card):
             margin=flet.margin.symmetric(horizontal=15),
             border_radius=5,
         )
+        self.history = BalanceHistory()
+        self.global_history: BalanceHistory | None = global_history
+        self.totals: GlobalTotals | None = totals
         self.net_owed: Decimal = Decimal(0)
         # Sets text values in debtSummary too
         self.money_you_owe: Decimal = Decimal(0)
@@ -464,8 +1074,13 @@ class NameTile(flet.Card):
             style=flet.ButtonStyle(shape=flet.ContinuousRectangleBorder(radius=10)),
         )
 
+        self.checkbox = flet.Checkbox(
+            visible=False, on_change=lambda e: self.parent.parent.update_selection()
+        )
+
         self.content.content.controls.extend(
             [
+                self.checkbox,
                 self.nameText,
                 flet.Divider(
                     color=flet.colors.WHITE, leading_indent=10, trailing_indent=10
@@ -486,9 +1101,19 @@ class NameTile(flet.Card):
                 title=flet.Text(self.name, weight=flet.FontWeight.BOLD),
                 color=flet.colors.BLACK,
                 bgcolor=flet.colors.SECONDARY_CONTAINER,
+                actions=[
+                    flet.IconButton(
+                        icon=flet.icons.ARCHIVE,
+                        tooltip="Archive old records",
+                        on_click=lambda e: self.page.run_task(
+                            self.view.records.archive_old_records
+                        ),
+                    )
+                ],
             ),
             bgcolor=flet.colors.BACKGROUND,
         )
+        diagnostics.track(self)
 
     @property
     def name(self) -> str:
@@ -520,8 +1145,10 @@ class NameTile(flet.Card):
             self._money_you_owe = Decimal(0)
         if not hasattr(self, "_money_they_owe"):
             self._money_they_owe = Decimal(0)
+        delta = val - self._money_you_owe
         self._money_you_owe: Decimal = val
         self.net_owed = self._money_you_owe - self._money_they_owe
+        self.record_balance(delta, Decimal(0))
         self.debtSummary.content.controls[0].value = "Money You Owe Them: " + str(val)
         self.debtSummary.content.controls[2].value = "Net Amount Owed: " + str(
             self.net_owed
@@ -537,22 +1164,108 @@ class NameTile(flet.Card):
             self._money_you_owe = Decimal(0)
         if not hasattr(self, "_money_they_owe"):
             self._money_they_owe = Decimal(0)
+        delta = val - self._money_they_owe
         self._money_they_owe: Decimal = val
         self.net_owed = self._money_you_owe - self._money_they_owe
+        self.record_balance(Decimal(0), delta)
         self.debtSummary.content.controls[1].value = "Money They Owe You: " + str(val)
         self.debtSummary.content.controls[2].value = "Net Amount Owed: " + str(
             self.net_owed
         )
 
+    def adjust_balance(
+        self,
+        credit: Decimal,
+        debit: Decimal,
+        changes: list[tuple[datetime, Decimal]] | None = None,
+    ):
+        # Applies many records' worth of change as a single balance change.
+        # changes places the points in the balance history, at the dates of the
+        # records they came from.
+        self._money_they_owe += credit
+        self._money_you_owe += debit
+        self.net_owed = self._money_you_owe - self._money_they_owe
+        self.record_balance(debit, credit, changes)
+        summary = self.debtSummary.content.controls
+        summary[0].value = "Money You Owe Them: " + str(self._money_you_owe)
+        summary[1].value = "Money They Owe You: " + str(self._money_they_owe)
+        summary[2].value = "Net Amount Owed: " + str(self.net_owed)
+
+    def record_balance(
+        self,
+        you_owe: Decimal,
+        they_owe: Decimal,
+        changes: list[tuple[datetime, Decimal]] | None = None,
+    ):
+        if self.totals is not None:
+            self.totals.apply(self.id, you_owe, they_owe)
+        if changes is None:
+            changes = [(datetime.now(), you_owe - they_owe)]
+        points = [(date.timestamp(), float(delta)) for date, delta in changes if delta]
+        if not points:
+            return
+        self.history.add_many(points)
+        if self.global_history is not None:
+            self.global_history.add_many(points)
+
+    def touch(self):
+        if self.dirty is not None:
+            self.dirty.add(self.id)
+
+    def rename(self):
+        self.touch()
+        # The dashboard lists people by name
+        if self.parent is not None and self.parent.parent is not None:
+            self.parent.parent.refresh_totals()
+
     def show_details(self, e):
         self.page.go(f"/{self.id}")
 
+    def statement_input(self) -> dict[str, Any]:
+        records = self.view.records
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "records": records.to_state(),
+            "archive": (
+                str(records.archive_path) if records.archive_path.exists() else None
+            ),
+        }
+
+    def to_state(self) -> dict[str, Any]:
+        records = self.view.records
+        return {
+            "id": self.id,
+            "name": self.name,
+            "history": self.history.to_state(),
+            "records": records.to_state(),
+            "scroll": records.scroll_offset,
+            "dirty": {i.id for i in records.dirty},
+            "deleted": records.deleted_ids,
+            "archived": records.archived,
+            "archive": records.archive_path,
+            "in_archive": records.in_archive,
+        }
+
 
 class NameList(flet.ListView):
     def __init__(self, route_manager: RouteManager):
-        super().__init__(expand=True, spacing=20)
+        super().__init__(
+            expand=True,
+            spacing=20,
+            on_scroll_interval=250,
+            on_scroll=self.track_scroll,
+        )
+        self.scroll_offset: float = 0
+        self.selecting: bool = False
 
         self.route_manager: RouteManager = route_manager
+        self.history = BalanceHistory()
+        self.totals = GlobalTotals()
+        self.replica = Replica()
+        # People whose name or records changed since the last sync
+        self.dirty: set[UUID] = set()
+        self.deleted_ids: set[UUID] = set()
 
         # tile = NameTile("HehE")
         # self.controls.append(tile)
@@ -572,18 +1285,20 @@ class NameList(flet.ListView):
             )
             self.page.update()
 
-            await func(self, *args, **kwargs)
-
-            self.page.overlay.clear()
-            self.page.update()
+            try:
+                await func(self, *args, **kwargs)
+            finally:
+                self.page.overlay.clear()
+                self.page.update()
 
         return add_loading
 
     @loading_animation
     async def add_name(self, name: str):
         self.auto_scroll = True
-        tile = NameTile(name)
+        tile = NameTile(name, self.history, totals=self.totals, dirty=self.dirty)
         self.controls.append(tile)
+        tile.touch()
         self.route_manager.add_route(tile.view.route, tile.view)
         self.parent.update()
         self.auto_scroll = False
@@ -592,12 +1307,154 @@ class NameList(flet.ListView):
     @loading_animation
     async def remove_name(self, tile: NameTile):
         self.controls.remove(tile)
-        self.route_manager.remove_route(tile.view.route)
+        self.forget(tile)
+        self.totals.remove(tile.id)
+        # Their balance leaves the overall total with them
+        self.history.add(datetime.now().timestamp(), float(-tile.net_owed))
         del tile.view
         del tile
         self.parent.update()
         await asyncio.sleep(0.25)
 
+    def forget(self, tile: NameTile):
+        self.route_manager.remove_route(tile.view.route)
+        tile.view.records.delete_archive()
+        diagnostics.release(tile, tile.view, *tile.view.records.controls)
+        self.dirty.discard(tile.id)
+        records = tile.view.records
+        self.deleted_ids.add(tile.id)
+        self.deleted_ids.update(
+            i.id for i in records.controls if isinstance(i, RecordTile)
+        )
+        self.deleted_ids.update(records.deleted_ids)
+        self.deleted_ids.update(records.archived)
+        # Records archived in earlier syncs are only left in the replica
+        self.deleted_ids.update(
+            UUID(i["id"]) for i in self.replica.person_entries(str(tile.id))
+        )
+
+    def selected_names(self) -> list[NameTile]:
+        return [i for i in self.controls if i.checkbox.value]
+
+    def set_selecting(self, selecting: bool, value: bool = False):
+        self.selecting = selecting
+        for i in self.controls:
+            i.checkbox.visible = selecting
+            i.checkbox.value = value
+        self.parent.show_selection(selecting)
+        self.parent.update()
+
+    def remove_selected(self):
+        tiles = self.selected_names()
+        ids = {i.id for i in tiles}
+        self.controls = [i for i in self.controls if i.id not in ids]
+        for tile in tiles:
+            self.forget(tile)
+            del tile.view
+        self.totals.remove(*ids)
+        self.history.add(
+            datetime.now().timestamp(), float(-sum(i.net_owed for i in tiles))
+        )
+        self.set_selecting(False)
+
+    def track_scroll(self, e: flet.OnScrollEvent):
+        self.scroll_offset = e.pixels
+
+    def restore(self, people: list[dict[str, Any]]):
+        for i in people:
+            tile = NameTile(i["name"], self.history, i["id"], self.totals, self.dirty)
+            records = tile.view.records
+            records.archive_path = i["archive"]
+            records.in_archive = i["in_archive"]
+            records.restore(i["records"])
+            records.scroll_offset = i["scroll"]
+            records.dirty = {
+                j
+                for j in records.controls
+                if isinstance(j, RecordTile) and j.id in i["dirty"]
+            }
+            records.deleted_ids = i["deleted"]
+            records.archived = i["archived"]
+            tile.history.restore(i["history"])
+            self.controls.append(tile)
+            self.route_manager.add_route(tile.view.route, tile.view)
+
+    def stage(self):
+        # Fold this session's edits into the replica. Only people touched since
+        # the last sync are looked at, and only changed entries get a new clock.
+        for id in self.dirty:
+            view = self.route_manager.routes.get(f"/{id}")
+            if view is None:
+                continue
+            person = str(id)
+            self.replica.put(
+                person, "person", person, PERSON_BUCKET, {"name": view.parent_tile.name}
+            )
+            records = view.records
+            for i in records.dirty:
+                self.replica.put(str(i.id), "record", person, i.bucket, i.sync_data())
+            # Records archived before they were ever synced are added first
+            for i, (bucket, data) in records.archived.items():
+                self.replica.put(str(i), "record", person, bucket, data)
+                self.replica.archive(str(i))
+            self.deleted_ids.update(records.deleted_ids)
+            records.dirty.clear()
+            records.archived.clear()
+            records.deleted_ids.clear()
+        self.dirty.clear()
+        for i in self.deleted_ids:
+            self.replica.delete(str(i))
+        self.deleted_ids.clear()
+
+    def apply_sync(self, changed: set[str]):
+        tiles = {str(i.id): i for i in self.controls}
+        for person in changed:
+            entries = self.replica.person_entries(person)
+            info = next((i for i in entries if i["kind"] == "person"), None)
+            if info is None:
+                continue
+            tile = tiles.get(person)
+            if info["deleted"]:
+                if tile is not None:
+                    self.controls.remove(tile)
+                    self.dirty.discard(tile.id)
+                    self.route_manager.remove_route(tile.view.route)
+                    tile.view.records.delete_archive()
+                    self.totals.remove(tile.id)
+                    diagnostics.release(tile, tile.view, *tile.view.records.controls)
+                    self.history.add(datetime.now().timestamp(), float(-tile.net_owed))
+                continue
+            if tile is None:
+                tile = NameTile(
+                    info["data"]["name"],
+                    self.history,
+                    UUID(person),
+                    self.totals,
+                    self.dirty,
+                )
+                self.controls.append(tile)
+                self.route_manager.add_route(tile.view.route, tile.view)
+            else:
+                tile.nameText.set_value(info["data"]["name"])
+            tile.view.records.apply_sync(
+                self.replica, [i for i in entries if i["kind"] == "record"]
+            )
+
+    @loading_animation
+    async def sync(self, peer: Peer):
+        self.stage()
+        # The peer may be across the network, the session keeps serving
+        try:
+            result = await asyncio.to_thread(reconcile, self.replica, peer)
+        except OSError as e:
+            logging.error(f"Sync failed: {e}")
+            return
+        self.apply_sync(result.changed)
+        logging.info(f"Synced: pulled {result.pulled}, pushed {result.pushed}")
+        # Names may have changed even where balances didn't
+        self.parent.show_totals()
+        self.parent.update()
+
 
 class NameView(flet.View):
     def __init__(
@@ -614,13 +1471,298 @@ class NameView(flet.View):
         self.route_manager: RouteManager = route_manager
         self.route_manager.base_view = self
         self.list = NameList(self.route_manager)
+        self.chart = BalanceChart(self.list.history)
+        if central is not None:
+            self.appbar.actions.append(
+                flet.IconButton(
+                    icon=flet.icons.SYNC, tooltip="Sync", on_click=self.sync
+                )
+            )
+        self.appbar.actions.append(
+            flet.IconButton(
+                icon=flet.icons.RECEIPT_LONG,
+                tooltip="Statements",
+                on_click=self.ask_statements,
+            )
+        )
+        self.appbar.actions.append(
+            flet.IconButton(
+                icon=flet.icons.CHECKLIST,
+                tooltip="Select",
+                on_click=lambda e: self.list.set_selecting(not self.list.selecting),
+            )
+        )
 
-        self.controls.append(self.list)
+        self.selectionText = flet.Text(color=flet.colors.ON_SECONDARY_CONTAINER)
+        self.selectionBar = flet.Container(
+            content=flet.Row(
+                [
+                    self.selectionText,
+                    flet.TextButton(
+                        "All", on_click=lambda e: self.list.set_selecting(True, True)
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.DELETE_FOREVER,
+                        tooltip="Delete",
+                        on_click=lambda e: self.list.remove_selected(),
+                    ),
+                    flet.IconButton(
+                        icon=flet.icons.CLOSE,
+                        tooltip="Done",
+                        on_click=lambda e: self.list.set_selecting(False),
+                    ),
+                ],
+                alignment=flet.MainAxisAlignment.SPACE_BETWEEN,
+            ),
+            bgcolor=flet.colors.SECONDARY_CONTAINER,
+            padding=flet.padding.symmetric(horizontal=10),
+            border_radius=10,
+            visible=False,
+        )
+
+        self.statementText = flet.Text(color=flet.colors.ON_SECONDARY_CONTAINER)
+        self.statementProgress = flet.ProgressBar(value=0, expand=True)
+        self.statementStatus = flet.Container(
+            content=flet.Row([self.statementText, self.statementProgress]),
+            bgcolor=flet.colors.SECONDARY_CONTAINER,
+            padding=10,
+            border_radius=10,
+            visible=False,
+        )
+
+        self.totalsText = [
+            flet.Text(color="#ff8597", italic=True),  # You Owe
+            flet.Text(color="#78d679", italic=True),  # Owed to You
+            flet.Text(color=flet.colors.ON_SECONDARY_CONTAINER),  # Net
+        ]
+        self.debtorsColumn = flet.Column(spacing=2, expand=True)
+        self.creditorsColumn = flet.Column(spacing=2, expand=True)
+        self.summary = flet.Container(
+            content=flet.Column(
+                [
+                    flet.Row(
+                        self.totalsText,
+                        alignment=flet.MainAxisAlignment.SPACE_AROUND,
+                        wrap=True,
+                    ),
+                    flet.Row(
+                        [self.debtorsColumn, self.creditorsColumn],
+                        vertical_alignment=flet.CrossAxisAlignment.START,
+                    ),
+                ],
+                spacing=5,
+                tight=True,
+            ),
+            bgcolor=flet.colors.SECONDARY_CONTAINER,
+            padding=10,
+            border_radius=10,
+        )
+        self._refresh: asyncio.TimerHandle | None = None
+        self.list.totals.on_change = self.refresh_totals
+        self.show_totals()
+        diagnostics.track(self)
+
+        self.controls.extend(
+            [
+                self.summary,
+                self.chart,
+                self.statementStatus,
+                self.selectionBar,
+                self.list,
+            ]
+        )
+
+    def show_totals(self):
+        totals = self.list.totals
+        self.totalsText[0].value = "You Owe: " + str(totals.you_owe)
+        self.totalsText[1].value = "Owed to You: " + str(totals.they_owe)
+        self.totalsText[2].value = "Net: " + str(totals.net)
+        self.debtorsColumn.controls = [
+            flet.Text("Owe You the Most", weight=flet.FontWeight.BOLD),
+            *self.top_people(totals.top_debtors(TOP_PEOPLE)),
+        ]
+        self.creditorsColumn.controls = [
+            flet.Text("You Owe the Most", weight=flet.FontWeight.BOLD),
+            *self.top_people(totals.top_creditors(TOP_PEOPLE)),
+        ]
+
+    def top_people(self, people: list[tuple[UUID, Decimal]]) -> list[flet.Text]:
+        texts = []
+        for id, amount in people:
+            view = self.route_manager.routes.get(f"/{id}")
+            if view is not None:
+                texts.append(flet.Text(f"{view.parent_tile.name}: {amount}"))
+        return texts
+
+    def refresh_totals(self):
+        # Every record of a sync or a batch changes the totals, they share one
+        # deferred redraw
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.show_totals()
+            return
+        if self._refresh is None:
+            self._refresh = loop.call_later(TOTALS_INTERVAL, self.delayed_refresh)
+
+    def delayed_refresh(self):
+        # Only the header is sent, the list is left alone
+        self._refresh = None
+        self.show_totals()
+        if self.summary.page:
+            try:
+                self.summary.update()
+            except flet.PageDisconnectedException:
+                pass
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "route": self.page.route,
+            "scroll": self.list.scroll_offset,
+            "history": self.list.history.to_state(),
+            "people": [i.to_state() for i in self.list.controls],
+            "replica": self.list.replica,
+            "deleted": self.list.deleted_ids,
+            "dirty": self.list.dirty,
+        }
+
+    def restore(self, state: dict[str, Any]):
+        self.list.restore(state["people"])
+        self.list.history.restore(state["history"])
+        self.list.scroll_offset = state["scroll"]
+        self.list.replica = state["replica"]
+        self.list.deleted_ids = state["deleted"]
+        self.list.dirty.update(state["dirty"])
+
+    def show_selection(self, selecting: bool):
+        self.selectionBar.visible = selecting
+        self.floating_action_button.visible = not selecting
+        self.selectionText.value = f"{len(self.list.selected_names())} selected"
+
+    def update_selection(self):
+        self.selectionText.value = f"{len(self.list.selected_names())} selected"
+        self.selectionText.update()
+
+    def restore_scroll(self, state: dict[str, Any]):
+        # Lists only accept scroll_to once they are on the page
+        for view in self.page.views:
+            if view is self:
+                self.list.scroll_to(offset=self.list.scroll_offset, duration=0)
+            elif isinstance(view, RecordView):
+                view.records.scroll_to(offset=view.records.scroll_offset, duration=0)
+
+    def release(self):
+        if self._refresh is not None:
+            self._refresh.cancel()
+            self._refresh = None
+        diagnostics.release(self)
+        for i in self.list.controls:
+            i.view.records.release()
+            diagnostics.release(i, i.view, *i.view.records.controls)
+
+    async def sync(self, e):
+        await self.list.sync(central)
+
+    async def ask_statements(self, e):
+        start = flet.TextField(
+            autofocus=True,
+            input_filter=flet.InputFilter(DATES_RE),
+            label="From (YYYY-MM-DD)",
+            value=f"{date.today().replace(day=1)}",
+        )
+        end = flet.TextField(
+            input_filter=flet.InputFilter(DATES_RE),
+            label="To (YYYY-MM-DD)",
+            value=f"{date.today()}",
+        )
+
+        async def confirm(e):
+            try:
+                i = datetime.fromisoformat(start.value.strip())
+                j = datetime.fromisoformat(end.value.strip())
+            except ValueError:
+                return
+            if i > j:
+                end.error_text = "Must not be before the start"
+                end.update()
+                return
+            dismiss_dialog(self.page)
+            await self.make_statements(i, j + timedelta(days=1, microseconds=-1))
+
+        dlg_modal = flet.AlertDialog(
+            title=flet.Text("Statements for Everyone"),
+            content=flet.Column([start, end], tight=True),
+            actions=[flet.TextButton("Confirm", on_click=confirm)],
+            actions_alignment=flet.MainAxisAlignment.END,
+            open=True,
+        )
+        self.page.dialog = dlg_modal
+        self.page.update()
+
+    async def make_statements(self, start: datetime, end: datetime):
+        tiles = list(self.list.controls)
+        if not tiles:
+            return
+        self.show_statement_progress(0, len(tiles))
+        self.statementStatus.visible = True
+        if self.statementStatus.page:
+            self.statementStatus.update()
+        # The work happens in a process pool, this thread only waits on it so
+        # the session stays responsive meanwhile
+        try:
+            done = await asyncio.to_thread(
+                generate_statements,
+                self.statement_inputs(tiles, asyncio.get_running_loop()),
+                len(tiles),
+                start,
+                end,
+                STATEMENTS_DIR,
+                on_progress=self.show_statement_progress,
+            )
+        except Exception:
+            logging.exception("Generating statements failed")
+            self.statementText.value = "Statements failed, see the server log"
+        else:
+            # People removed meanwhile have no statement
+            self.statementText.value = (
+                f"Saved {done} of {len(tiles)} statements"
+                f" to {STATEMENTS_DIR.resolve()}"
+            )
+            self.statementProgress.value = 1
+        if self.statementStatus.page:
+            self.statementStatus.update()
+        await asyncio.sleep(5)
+        self.statementStatus.visible = False
+        if self.statementStatus.page:
+            self.statementStatus.update()
+
+    def statement_inputs(
+        self, tiles: list[NameTile], loop: asyncio.AbstractEventLoop
+    ) -> Iterator[dict[str, Any]]:
+        # Pulled from the thread feeding the pool. Each chunk is copied on the
+        # event loop so it can't race with edits, and only the chunks in flight
+        # are held at once. People removed meanwhile are skipped.
+        async def snapshot(chunk: list[NameTile]) -> list[dict[str, Any]]:
+            return [
+                i.statement_input()
+                for i in chunk
+                if f"/{i.id}" in self.route_manager.routes
+            ]
+
+        for i in range(0, len(tiles), CHUNK_SIZE):
+            chunk = tiles[i : i + CHUNK_SIZE]
+            yield from asyncio.run_coroutine_threadsafe(snapshot(chunk), loop).result()
+
+    def show_statement_progress(self, done: int, total: int):
+        self.statementText.value = f"Statements: {done}/{total}"
+        self.statementProgress.value = done / total
+        if self.statementStatus.page:
+            self.statementStatus.update()
 
     async def add_name(self, e):
         async def close_dialog(e):
             if dlg_modal.content.value.strip():
-                self.page.close_dialog()
+                dismiss_dialog(self.page)
                 await self.list.add_name(dlg_modal.content.value.strip())
 
         dlg_modal = flet.AlertDialog(
@@ -650,7 +1792,20 @@ async def main(page: flet.Page):
         on_inverse_surface="#1b1a55",
     )
     page.theme = flet.Theme(color_scheme=custom_color_scheme)
-    test_view = NameView(
+    page.views.clear()
+    page.on_route_change = route_manager.on_route_change
+    page.on_view_pop = route_manager.on_view_pop
+    diagnostics.start_session(page)
+
+    hibernator = SessionHibernator(
+        page, route_manager, lambda: build_name_view(route_manager)
+    )
+    hibernator.start(build_name_view(route_manager))
+    page.go(page.route)
+
+
+def build_name_view(route_manager: RouteManager) -> NameView:
+    return NameView(
         "/",
         route_manager,
         flet.AppBar(
@@ -666,10 +1821,23 @@ async def main(page: flet.Page):
         ),
         bgcolor=flet.colors.BACKGROUND,
     )
-    page.views.clear()
-    page.on_route_change = test_view.route_manager.on_route_change
-    page.on_view_pop = test_view.route_manager.on_view_pop
-    page.go(page.route)
 
 
-app: FastAPI | None = flet.app(main, assets_dir="dt/assets")
+# Statement workers are spawned and re-import the main module as __mp_main__,
+# they must not start another app
+app: FastAPI | None = None
+central: Peer | None = None
+if __name__ != "__mp_main__":
+    if SYNC_URL:
+        central = HttpPeer(SYNC_URL, SYNC_TOKEN)
+    elif SYNC_PATH:
+        central = ReplicaStore(SYNC_PATH)
+    # DT_EXPORT_ASGI=1 exposes the app for an ASGI server, e.g. uvicorn dt.main:app
+    app = flet.app(
+        main,
+        assets_dir="dt/assets",
+        export_asgi_app=os.getenv("DT_EXPORT_ASGI") == "1",
+    )
+    diagnostics.install(app)
+    if isinstance(central, ReplicaStore):
+        sync.install(app, central, SYNC_TOKEN)
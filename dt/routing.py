@@ -29,6 +29,10 @@ class RouteManager:
     def remove_route(self, route: str):
         self.routes.pop(route)
 
+    def clear(self):
+        self.routes.clear()
+        self._base_view = None
+
     async def on_route_change(self, route_event: RouteChangeEvent):
         temp: list[View] = [i for i in self.page.views]
         self.page.views.clear()
@@ -0,0 +1,163 @@
+import csv
+import html
+import multiprocessing
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from .archive import RecordArchive
+
+# People per task, and tasks a worker runs before it is replaced so a worker's
+# memory can't grow over a long run
+CHUNK_SIZE = 25
+MAX_TASKS_PER_CHILD = 20
+
+STATEMENT_HEADER = ["Date", "Type", "Title", "Description", "Amount", "Balance"]
+
+
+def signed(type: str, amount: Decimal) -> Decimal:
+    # Same sign as NameTile.net_owed: debits are owed to them, credits to you
+    return amount if type == "Debit" else -amount
+
+
+def statement_rows(
+    person: dict[str, Any], start: datetime, end: datetime
+) -> tuple[Decimal, list[list[Any]], Decimal]:
+    opening = Decimal(0)
+    period: list[dict[str, Any]] = []
+
+    if person.get("archive"):
+        with RecordArchive(person["archive"]) as archive:
+            # Archive ranges are inclusive and stored to the microsecond
+            credit, debit = archive.totals(end=start - timedelta(microseconds=1))
+            opening += debit - credit
+            period.extend(
+                i._asdict() for i in archive.page(*archive.index_range(start, end))
+            )
+
+    for record in person["records"]:
+        if record["dateCreated"] < start:
+            opening += signed(record["type"], record["amount"])
+        elif record["dateCreated"] <= end:
+            period.append(record)
+
+    rows = []
+    balance = opening
+    for record in sorted(period, key=lambda r: r["dateCreated"]):
+        balance += signed(record["type"], record["amount"])
+        rows.append(
+            [
+                record["dateCreated"].isoformat(sep=" ", timespec="seconds"),
+                record["type"],
+                record["title"],
+                record["description"],
+                record["amount"],
+                balance,
+            ]
+        )
+    return opening, rows, balance
+
+
+def statement_name(person: dict[str, Any]) -> str:
+    return re.sub(r"[^a-zA-Z0-9]+", "-", person["name"]).strip("-") + "-" + person["id"]
+
+
+def write_csv(path: Path, opening: Decimal, rows: list[list[Any]], closing: Decimal):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Opening Balance", opening])
+        writer.writerow(STATEMENT_HEADER)
+        writer.writerows(rows)
+        writer.writerow(["Closing Balance", closing])
+
+
+def write_html(
+    path: Path,
+    person: dict[str, Any],
+    start: datetime,
+    end: datetime,
+    opening: Decimal,
+    rows: list[list[Any]],
+    closing: Decimal,
+):
+    with open(path, "w") as f:
+        name = html.escape(person["name"])
+        f.write(
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>Statement for {name}</title></head><body>"
+            f"<h1>{name}</h1><p>{start:%Y-%m-%d} to {end:%Y-%m-%d}</p>"
+            f"<p>Opening Balance: {opening}</p><table><tr>"
+        )
+        f.write("".join(f"<th>{i}</th>" for i in STATEMENT_HEADER) + "</tr>")
+        for row in rows:
+            f.write(
+                "<tr>"
+                + "".join(f"<td>{html.escape(str(i))}</td>" for i in row)
+                + "</tr>"
+            )
+        f.write(f"</table><p>Closing Balance: {closing}</p></body></html>")
+
+
+def generate_statement(
+    person: dict[str, Any], start: datetime, end: datetime, out_dir: Path
+) -> list[Path]:
+    opening, rows, closing = statement_rows(person, start, end)
+    name = statement_name(person)
+    csv_path, html_path = out_dir / f"{name}.csv", out_dir / f"{name}.html"
+    write_csv(csv_path, opening, rows, closing)
+    write_html(html_path, person, start, end, opening, rows, closing)
+    return [csv_path, html_path]
+
+
+def generate_chunk(
+    people: list[dict[str, Any]], start: datetime, end: datetime, out_dir: Path
+) -> int:
+    for person in people:
+        generate_statement(person, start, end, out_dir)
+    return len(people)
+
+
+def generate_statements(
+    people: Iterable[dict[str, Any]],
+    total: int,
+    start: datetime,
+    end: datetime,
+    out_dir: str | os.PathLike,
+    workers: int | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> int:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    people = iter(people)
+    done = 0
+
+    # Forking a server process that runs other threads can deadlock the child,
+    # so workers are spawned fresh
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=MAX_TASKS_PER_CHILD,
+    ) as pool:
+        # Only a couple of chunks per worker are in flight at once, so the
+        # pickled input never has to exist for everyone at the same time
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(people, CHUNK_SIZE))
+                if not chunk:
+                    break
+                pending.add(pool.submit(generate_chunk, chunk, start, end, out_dir))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done += future.result()
+                if on_progress is not None:
+                    on_progress(done, total)
+    return done
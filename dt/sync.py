@@ -0,0 +1,399 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, NamedTuple, Protocol
+from uuid import uuid4
+
+# Tree layout: root -> person shard -> person id -> bucket -> entry shard ->
+# entry id. A person's own entry (their name) lives in the PERSON_BUCKET
+# bucket, records are bucketed by the month they were created in. Shards are
+# the first SHARD_DIGITS hex digits of a hash of the id below them, so however
+# many people and records there are, no node has more than 16**SHARD_DIGITS
+# shards under it and each shard only a fraction of the ids.
+PERSON_BUCKET = ""
+SHARD_DIGITS = 2
+# Length of the path to a leaf, whose children are entry ids
+DEPTH = 4
+# Seconds to wait on each request to a remote replica
+SYNC_TIMEOUT = 30
+
+Entry = dict[str, Any]
+ENTRY_FIELDS: dict[str, type] = {
+    "id": str,
+    "kind": str,
+    "person": str,
+    "bucket": str,
+    "data": dict,
+    "deleted": bool,
+    "archived": bool,
+}
+
+
+def shard(id: str) -> str:
+    return hashlib.sha256(id.encode()).hexdigest()[:SHARD_DIGITS]
+
+
+def entry_path(entry: Entry) -> tuple[str, ...]:
+    return (
+        shard(entry["person"]),
+        entry["person"],
+        entry["bucket"],
+        shard(entry["id"]),
+    )
+
+
+def entry_hash(entry: Entry) -> str:
+    encoded = json.dumps(entry, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def dump_entry(entry: Entry) -> str:
+    return json.dumps(entry, separators=(",", ":"))
+
+
+def check_entry(entry: Any) -> Entry:
+    # Entries from the network are checked before any of them is applied
+    if not isinstance(entry, dict) or any(
+        not isinstance(entry.get(k), t) for k, t in ENTRY_FIELDS.items()
+    ):
+        raise ValueError("Malformed entry")
+    clock = entry.get("clock")
+    if (
+        not isinstance(clock, (list, tuple))
+        or len(clock) != 2
+        or not isinstance(clock[0], int)
+        or not isinstance(clock[1], str)
+    ):
+        raise ValueError("Malformed entry clock")
+    return entry
+
+
+def node_hash(children: dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for key in sorted(children):
+        digest.update(f"{key}:{children[key]};".encode())
+    return digest.hexdigest()
+
+
+class Peer(Protocol):
+    def root(self) -> str: ...
+
+    def children(self, path: tuple[str, ...]) -> dict[str, str]: ...
+
+    def fetch(self, ids: list[str]) -> list[Entry]: ...
+
+    def apply(self, entries: list[Entry]) -> tuple[int, set[str]]: ...
+
+
+class Replica:
+    def __init__(self, replica_id: str | None = None):
+        self.replica_id: str = replica_id or uuid4().hex
+        self.entries: dict[str, Entry] = {}
+        # Nested dicts DEPTH deep, leaves map entry ids to entry hashes
+        self.tree: dict[str, Any] = {}
+        self._hashes: dict[tuple[str, ...], str] = {}
+        self._clock: int = 0
+
+    # Hybrid clock: wall time in microseconds that never goes backwards and
+    # always passes any clock seen from a peer. The replica id breaks ties so
+    # every replica picks the same winner.
+    def tick(self) -> tuple[int, str]:
+        self._clock = max(time.time_ns() // 1000, self._clock + 1)
+        return (self._clock, self.replica_id)
+
+    def put(
+        self,
+        id: str,
+        kind: str,
+        person: str,
+        bucket: str,
+        data: dict[str, Any],
+        deleted: bool = False,
+    ) -> bool:
+        current = self.entries.get(id)
+        # Archived records are settled, later edits of a copy don't revive them
+        if current is not None and current.get("archived"):
+            return False
+        if (
+            current is not None
+            and current["data"] == data
+            and current["person"] == person
+            and current["bucket"] == bucket
+            and current["deleted"] == deleted
+        ):
+            return False
+        self._store(
+            {
+                "id": id,
+                "kind": kind,
+                "person": person,
+                "bucket": bucket,
+                "data": data,
+                "deleted": deleted,
+                "archived": False,
+                "clock": self.tick(),
+            }
+        )
+        return True
+
+    def delete(self, id: str) -> bool:
+        current = self.entries.get(id)
+        if current is None or current["deleted"]:
+            return False
+        self._store({**current, "deleted": True, "clock": self.tick()})
+        return True
+
+    def archive(self, id: str) -> bool:
+        # The record moved into its person's archive, it still counts but is
+        # never shown as a live record again
+        current = self.entries.get(id)
+        if current is None or current["deleted"] or current.get("archived"):
+            return False
+        self._store({**current, "archived": True, "clock": self.tick()})
+        return True
+
+    def person_entries(self, person: str) -> list[Entry]:
+        buckets = self.tree.get(shard(person), {}).get(person, {})
+        return [
+            self.entries[i]
+            for bucket in buckets.values()
+            for leaf in bucket.values()
+            for i in leaf
+        ]
+
+    def _store(self, entry: Entry):
+        current = self.entries.get(entry["id"])
+        if current is not None:
+            self._unlink(current)
+        self.entries[entry["id"]] = entry
+        path = entry_path(entry)
+        node = self.tree
+        for key in path:
+            node = node.setdefault(key, {})
+        node[entry["id"]] = entry_hash(entry)
+        self._invalidate(path)
+
+    def _unlink(self, entry: Entry):
+        path = entry_path(entry)
+        nodes = [self.tree]
+        for key in path:
+            nodes.append(nodes[-1][key])
+        del nodes[-1][entry["id"]]
+        # Drop nodes left empty, bottom up
+        for depth in range(len(path), 0, -1):
+            if nodes[depth]:
+                break
+            del nodes[depth - 1][path[depth - 1]]
+        self._invalidate(path)
+
+    def _invalidate(self, path: tuple[str, ...]):
+        for depth in range(len(path) + 1):
+            self._hashes.pop(path[:depth], None)
+
+    # Peer interface
+
+    def root(self) -> str:
+        return self._node((), self.tree)
+
+    def _node(self, path: tuple[str, ...], children: dict[str, Any]) -> str:
+        # Only nodes on the path of a change are rehashed
+        if path not in self._hashes:
+            if len(path) == DEPTH:
+                self._hashes[path] = node_hash(children)
+            else:
+                self._hashes[path] = node_hash(
+                    {k: self._node((*path, k), v) for k, v in children.items()}
+                )
+        return self._hashes[path]
+
+    def children(self, path: tuple[str, ...]) -> dict[str, str]:
+        node: dict[str, Any] = self.tree
+        for key in path:
+            node = node.get(key, {})
+        if len(path) == DEPTH:
+            return dict(node)
+        return {k: self._node((*path, k), v) for k, v in node.items()}
+
+    def fetch(self, ids: list[str]) -> list[Entry]:
+        return [self.entries[i] for i in ids if i in self.entries]
+
+    def apply(self, entries: list[Entry]) -> tuple[int, set[str]]:
+        # Last writer wins, compared by clock so both sides agree on the winner.
+        # Returns how many entries were taken and the people they touched.
+        accepted = 0
+        changed: set[str] = set()
+        for entry in entries:
+            entry = {**entry, "clock": tuple(entry["clock"])}
+            self._clock = max(self._clock, entry["clock"][0])
+            current = self.entries.get(entry["id"])
+            if current is not None and current["clock"] >= entry["clock"]:
+                continue
+            if current is not None:
+                changed.add(current["person"])
+            changed.add(entry["person"])
+            self._store(entry)
+            accepted += 1
+        return accepted, changed
+
+
+class SyncResult(NamedTuple):
+    pulled: int
+    pushed: int
+    changed: set[str]
+
+
+def reconcile(local: Replica, remote: Peer) -> SyncResult:
+    # Descend only into subtrees whose hashes differ, so the work and traffic
+    # grow with the number of changes rather than the size of the ledger
+    pulled = pushed = 0
+    changed: set[str] = set()
+    if local.root() == remote.root():
+        return SyncResult(pulled, pushed, changed)
+
+    stack: list[tuple[str, ...]] = [()]
+    while stack:
+        path = stack.pop()
+        ours, theirs = local.children(path), remote.children(path)
+        if len(path) < DEPTH:
+            stack.extend(
+                (*path, key)
+                for key in ours.keys() | theirs.keys()
+                if ours.get(key) != theirs.get(key)
+            )
+            continue
+
+        pull = [i for i, h in theirs.items() if ours.get(i) != h]
+        push = [i for i, h in ours.items() if theirs.get(i) != h]
+        if pull:
+            accepted, people = local.apply(remote.fetch(pull))
+            changed |= people
+            pulled += accepted
+        if push:
+            accepted, _ = remote.apply(local.fetch(push))
+            pushed += accepted
+    return SyncResult(pulled, pushed, changed)
+
+
+class ReplicaStore:
+    # The central replica. It stays in memory, and every entry it takes is
+    # appended to a JSON lines log, so a sync only writes what changed. JSON
+    # rather than pickle, whoever can write the file can't run code with it.
+    # Calls may come from several threads at once.
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self.replica = Replica("central")
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.replica.apply([json.loads(i) for i in f if i.strip()])
+        # Versions superseded since the last start are dropped
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(self.path.name + ".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            for entry in self.replica.entries.values():
+                f.write(dump_entry(entry) + "\n")
+        os.replace(temp, self.path)
+
+    def root(self) -> str:
+        with self._lock:
+            return self.replica.root()
+
+    def children(self, path: tuple[str, ...]) -> dict[str, str]:
+        with self._lock:
+            return self.replica.children(path)
+
+    def fetch(self, ids: list[str]) -> list[Entry]:
+        with self._lock:
+            return self.replica.fetch(ids)
+
+    def apply(self, entries: list[Entry]) -> tuple[int, set[str]]:
+        with self._lock:
+            accepted, changed = self.replica.apply(entries)
+            if accepted:
+                stored = [self.replica.entries[i["id"]] for i in entries]
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for entry, current in zip(entries, stored):
+                        if current["clock"] == tuple(entry["clock"]):
+                            f.write(dump_entry(current) + "\n")
+            return accepted, changed
+
+
+def serve(peer: Peer, request: Any) -> Any:
+    # Answers one call from an HttpPeer
+    call = request["call"]
+    if call == "root":
+        return peer.root()
+    if call == "children":
+        path = tuple(str(i) for i in request["path"])
+        if len(path) > DEPTH:
+            raise ValueError("Path is below the leaves")
+        return peer.children(path)
+    if call == "fetch":
+        return peer.fetch([str(i) for i in request["ids"]])
+    if call == "apply":
+        accepted, changed = peer.apply([check_entry(i) for i in request["entries"]])
+        return [accepted, sorted(changed)]
+    raise ValueError(f"Unknown sync call {call!r}")
+
+
+class HttpPeer:
+    # A replica served by install() on another server. Each call is a request,
+    # so reconcile() moves only the hashes and entries of differing subtrees.
+    def __init__(
+        self, url: str, token: str | None = None, timeout: float = SYNC_TIMEOUT
+    ):
+        self.url: str = url
+        self.token: str | None = token
+        self.timeout: float = timeout
+
+    def _call(self, call: str, **args: Any) -> Any:
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            self.url, json.dumps({"call": call, **args}).encode(), headers
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def root(self) -> str:
+        return self._call("root")
+
+    def children(self, path: tuple[str, ...]) -> dict[str, str]:
+        return self._call("children", path=list(path))
+
+    def fetch(self, ids: list[str]) -> list[Entry]:
+        return self._call("fetch", ids=ids)
+
+    def apply(self, entries: list[Entry]) -> tuple[int, set[str]]:
+        accepted, changed = self._call("apply", entries=entries)
+        return accepted, set(changed)
+
+
+def install(app: Any, peer: Peer, token: str | None = None):
+    # Serves peer at /sync for HttpPeer
+    if app is None:
+        return
+    from fastapi import HTTPException, Request
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import APIRoute
+
+    async def sync(request: Request):
+        if token and not hmac.compare_digest(
+            request.headers.get("authorization", ""), f"Bearer {token}"
+        ):
+            raise HTTPException(401)
+        try:
+            result = await asyncio.to_thread(serve, peer, await request.json())
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(400, str(e))
+        return JSONResponse(result)
+
+    # Ahead of flet's static files, which are mounted at the root
+    app.router.routes.insert(0, APIRoute("/sync", sync, methods=["POST"]))
@@ -0,0 +1,86 @@
+import heapq
+from decimal import Decimal
+from typing import Callable
+from uuid import UUID
+
+
+class GlobalTotals:
+    def __init__(self):
+        self.you_owe: Decimal = Decimal(0)
+        self.they_owe: Decimal = Decimal(0)
+        self.people: dict[UUID, tuple[Decimal, Decimal]] = {}
+        self.on_change: Callable[[], None] | None = None
+
+        # Heaps hold (priority, version, person). Entries are never updated in
+        # place, a change pushes a new one and older versions are skipped when
+        # they surface.
+        self._versions: dict[UUID, int] = {}
+        self._version: int = 0
+        self._debtors: list[tuple[Decimal, int, UUID]] = []
+        self._creditors: list[tuple[Decimal, int, UUID]] = []
+
+    @property
+    def net(self) -> Decimal:
+        return self.you_owe - self.they_owe
+
+    def apply(self, person: UUID, you_owe: Decimal, they_owe: Decimal):
+        if not you_owe and not they_owe:
+            return
+        self.you_owe += you_owe
+        self.they_owe += they_owe
+        current_you, current_they = self.people.get(person, (Decimal(0), Decimal(0)))
+        current_you += you_owe
+        current_they += they_owe
+        self.people[person] = (current_you, current_they)
+
+        self._version += 1
+        self._versions[person] = self._version
+        net = current_you - current_they
+        if net < 0:
+            heapq.heappush(self._debtors, (net, self._version, person))
+        elif net > 0:
+            heapq.heappush(self._creditors, (-net, self._version, person))
+        self._compact()
+        if self.on_change is not None:
+            self.on_change()
+
+    def remove(self, *people: UUID):
+        people = [i for i in people if i in self.people]
+        if not people:
+            return
+        for person in people:
+            you_owe, they_owe = self.people.pop(person)
+            del self._versions[person]
+            self.you_owe -= you_owe
+            self.they_owe -= they_owe
+        self._compact()
+        if self.on_change is not None:
+            self.on_change()
+
+    def top_debtors(self, n: int) -> list[tuple[UUID, Decimal]]:
+        # People who owe you the most
+        return self._top(self._debtors, n)
+
+    def top_creditors(self, n: int) -> list[tuple[UUID, Decimal]]:
+        # People you owe the most
+        return self._top(self._creditors, n)
+
+    def _top(
+        self, heap: list[tuple[Decimal, int, UUID]], n: int
+    ) -> list[tuple[UUID, Decimal]]:
+        found = []
+        while heap and len(found) < n:
+            entry = heapq.heappop(heap)
+            if self._versions.get(entry[2]) == entry[1]:
+                found.append(entry)
+        for entry in found:
+            heapq.heappush(heap, entry)
+        return [(person, -priority) for priority, _, person in found]
+
+    def _compact(self):
+        # Rebuild once stale entries outnumber live ones, so the heaps stay
+        # proportional to the number of people
+        for heap in (self._debtors, self._creditors):
+            if len(heap) > 2 * len(self._versions) + 16:
+                heap[:] = [i for i in heap if self._versions.get(i[2]) == i[1]]
+                heapq.heapify(heap)
@@ -0,0 +1,4 @@
+import os
+
+# dt.main serves the app when imported, unless it is exported for an ASGI server
+os.environ.setdefault("DT_EXPORT_ASGI", "1")
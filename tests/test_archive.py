@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from dt.archive import ArchivedRecord, RecordArchive, append_archive, write_archive
+
+START = datetime(2024, 1, 1)
+
+
+def make_records(count: int, offset: int = 0) -> list[ArchivedRecord]:
+    return [
+        ArchivedRecord(
+            "Credit" if i % 2 else "Debit",
+            f"title{i}",
+            f"déscr {i}",
+            Decimal(i) / 4,
+            START + timedelta(days=i),
+        )
+        for i in range(offset, offset + count)
+    ]
+
+
+def test_write_and_reopen(tmp_path):
+    path = tmp_path / "a.dtarc"
+    records = make_records(30)
+    write_archive(path, records)
+    with RecordArchive(path) as archive:
+        assert len(archive) == 30
+        assert list(archive) == records
+        assert archive[-1] == records[-1]
+        assert archive.credit_total == sum(r.amount for r in records[1::2])
+        assert archive.debit_total == sum(r.amount for r in records[::2])
+        with pytest.raises(IndexError):
+            archive[30]
+
+
+def test_append_keeps_order_and_totals(tmp_path):
+    path = tmp_path / "a.dtarc"
+    records = make_records(10)
+    append_archive(path, records[:5]).close()
+    append_archive(path, records[5:]).close()
+    # Older than the tail, the archive is rebuilt in order
+    older = ArchivedRecord("Credit", "old", "", Decimal(1), START - timedelta(days=1))
+    with append_archive(path, [older]) as archive:
+        assert list(archive) == [older, *records]
+        assert archive.credit_total == Decimal(1) + sum(r.amount for r in records[1::2])
+
+
+def test_rejects_extra_precision(tmp_path):
+    record = ArchivedRecord("Debit", "t", "d", Decimal("0.00001"), START)
+    with pytest.raises(ValueError):
+        write_archive(tmp_path / "a.dtarc", [record])
+
+
+def test_totals_ranges(tmp_path):
+    path = tmp_path / "a.dtarc"
+    records = make_records(30)
+    write_archive(path, records)
+    with RecordArchive(path) as archive:
+        start, end = START + timedelta(days=10), START + timedelta(days=19)
+        assert archive.index_range(start, end) == (10, 20)
+        credit, debit = archive.totals(start, end)
+        assert credit == sum(r.amount for r in records[10:20] if r.type == "Credit")
+        assert debit == sum(r.amount for r in records[10:20] if r.type == "Debit")
+        assert archive.totals() == (archive.credit_total, archive.debit_total)
+        assert archive.totals(START + timedelta(days=100)) == (0, 0)
+
+
+def test_search(tmp_path):
+    path = tmp_path / "a.dtarc"
+    write_archive(path, make_records(30))
+    with RecordArchive(path) as archive:
+        assert list(archive.search("title1")) == [1, *range(10, 20)]
+        assert list(archive.search("déscr 2")) == [2, *range(20, 30)]
+        assert list(archive.search("missing")) == []
+        assert list(archive.search("")) == []
+
+
+def test_search_ignores_hits_across_fields(tmp_path):
+    path = tmp_path / "a.dtarc"
+    write_archive(path, make_records(30))
+    with RecordArchive(path) as archive:
+        # "title9" + "déscr 9" are stored back to back
+        assert list(archive.search("9déscr")) == []
+        assert list(archive.search("9")) == [9, 19, 29]
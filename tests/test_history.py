@@ -0,0 +1,113 @@
+import random
+from itertools import accumulate
+
+from dt.history import BLOCK_SIZE, BalanceHistory, lttb
+
+
+def make_history(deltas: list[float]) -> BalanceHistory:
+    # One point a second, from a single batch like a sync or a restore
+    history = BalanceHistory()
+    history.add_many([(float(i), delta) for i, delta in enumerate(deltas)])
+    return history
+
+
+def random_deltas(rng: random.Random, count: int) -> list[float]:
+    # Whole numbers are summed exactly, and none is zero so every delta is a point
+    return [float(rng.randint(1, 100) * rng.choice((-1, 1))) for _ in range(count)]
+
+
+def test_lttb_keeps_short_series():
+    xs, ys = [0.0, 1.0, 2.0], [5.0, 3.0, 4.0]
+    assert lttb(xs, ys, 10) == list(zip(xs, ys))
+
+
+def test_lttb_keeps_ends_and_peaks():
+    xs = [float(i) for i in range(100)]
+    ys = [0.0] * 100
+    ys[37] = 50.0
+    ys[71] = -50.0
+    sampled = lttb(xs, ys, 10)
+    assert len(sampled) == 10
+    assert sampled[0] == (0.0, 0.0)
+    assert sampled[-1] == (99.0, 0.0)
+    assert (37.0, 50.0) in sampled
+    assert (71.0, -50.0) in sampled
+
+
+def test_blocks_hold_min_and_max():
+    rng = random.Random(1)
+    deltas = random_deltas(rng, BLOCK_SIZE * 3 + 10)
+    history = make_history(deltas)
+    balances = list(accumulate(deltas))
+    assert history.balances == balances
+    assert len(history.blocks) == 4
+    for b, (lo, hi) in enumerate(history.blocks):
+        block = balances[b * BLOCK_SIZE : (b + 1) * BLOCK_SIZE]
+        assert balances[lo] == min(block)
+        assert balances[hi] == max(block)
+
+
+def test_min_max_downsample_keeps_extremes():
+    rng = random.Random(2)
+    deltas = random_deltas(rng, BLOCK_SIZE * 200)
+    deltas[12345], deltas[12346] = 1e6, -1e6
+    deltas[40000], deltas[40001] = -1e6, 1e6
+    history = make_history(deltas)
+    points = history.downsample(threshold=100)
+    assert len(points) <= 100
+    assert (12345.0, history.balances[12345]) in points
+    assert (40000.0, history.balances[40000]) in points
+    assert max(history.balances) == history.balances[12345]
+    assert min(history.balances) == history.balances[40000]
+    assert points == sorted(points)
+
+
+def test_downsample_range():
+    history = make_history([1.0] * 1000)
+    points = history.downsample(100.0, 199.0, threshold=300)
+    assert points == [(float(i), float(i + 1)) for i in range(100, 200)]
+
+
+def test_add_many_appends_running_balance():
+    history = BalanceHistory()
+    history.add_many([(2.0, 5.0), (1.0, 10.0), (3.0, 0.0)])
+    assert history.timestamps == [1.0, 2.0]
+    assert history.balances == [10.0, 15.0]
+
+
+def test_add_many_backdated_shifts_later_balances():
+    history = BalanceHistory()
+    history.add_many([(10.0, 5.0), (20.0, 5.0), (30.0, 5.0)])
+    history.add(15.0, 100.0)
+    assert history.timestamps == [10.0, 15.0, 20.0, 30.0]
+    assert history.balances == [5.0, 105.0, 110.0, 115.0]
+    history.add(0.0, -1.0)
+    assert history.balances == [-1.0, 4.0, 104.0, 109.0, 114.0]
+
+
+def test_add_many_backdated_rebuilds_blocks():
+    history = make_history([1.0] * (BLOCK_SIZE * 2))
+    history.add(BLOCK_SIZE + 0.5, -10_000.0)
+    lo, hi = history.blocks[1]
+    assert history.balances[lo] == -10_000.0 + BLOCK_SIZE + 1
+    assert history.balances[hi] == max(history.balances[BLOCK_SIZE:])
+    assert len(history.blocks) == 3
+
+
+def test_listeners_get_first_changed_index():
+    history = make_history([1.0, 1.0, 1.0])
+    changed = []
+    history.subscribe(changed.append)
+    history.add(5.0, 1.0)
+    history.add(0.5, 1.0)
+    assert changed == [3, 1]
+    assert history.version == 3
+
+
+def test_state_round_trip():
+    history = make_history([float(i % 7 + 1) for i in range(BLOCK_SIZE + 3)])
+    restored = BalanceHistory()
+    restored.restore(history.to_state())
+    assert restored.timestamps == history.timestamps
+    assert restored.balances == history.balances
+    assert restored.blocks == history.blocks
@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from dt import main
+from dt.main import NameList, NameTile, RecordTile
+from dt.routing import RouteManager
+from dt.sync import Replica, reconcile
+
+OLD = datetime.now() - timedelta(days=400)
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "ARCHIVE_DIR", tmp_path)
+
+
+def make_people() -> NameList:
+    # No page, the lists and tiles work without one
+    return NameList(RouteManager(None))
+
+
+def add_person(people: NameList, name: str) -> NameTile:
+    tile = NameTile(name, people.history, totals=people.totals, dirty=people.dirty)
+    people.controls.append(tile)
+    people.route_manager.add_route(tile.view.route, tile.view)
+    tile.touch()
+    return tile
+
+
+def add_record(
+    tile: NameTile, type: str, amount: str, date: datetime | None = None
+) -> RecordTile:
+    record = RecordTile(
+        tile.view, type, "title", "description", Decimal(amount), date_created=date
+    )
+    tile.view.records.controls.append(record)
+    record.touch()
+    return record
+
+
+def live_records(tile: NameTile) -> list[RecordTile]:
+    return [i for i in tile.view.records.controls if isinstance(i, RecordTile)]
+
+
+def sync(people: NameList, central: Replica):
+    people.stage()
+    people.apply_sync(reconcile(people.replica, central).changed)
+
+
+def test_archived_records_count_on_other_replicas():
+    central = Replica("central")
+    a, b = make_people(), make_people()
+    alice = add_person(a, "Alice")
+    add_record(alice, "Debit", "10", OLD)
+    add_record(alice, "Credit", "1.2346")
+    assert alice.view.records.archive_before(datetime.now() - timedelta(days=90))
+    sync(a, central)
+    sync(b, central)
+
+    copy = b.controls[0]
+    assert copy.net_owed == alice.net_owed == Decimal("8.7654")
+    assert b.totals.net == a.totals.net
+    assert copy.history.last == alice.history.last
+    assert [i.amount for i in live_records(copy)] == [Decimal("1.2346")]
+    records = copy.view.records
+    assert [i.amount for i in records.archive] == [Decimal(10)]
+    assert records.archive_path != alice.view.records.archive_path
+
+    # Seen once, however often it is synced
+    add_record(alice, "Credit", "1")
+    sync(a, central)
+    sync(b, central)
+    assert copy.net_owed == alice.net_owed == Decimal("7.7654")
+    assert len(records.archive) == 1
+
+
+def test_live_copy_moves_into_archive():
+    central = Replica("central")
+    a, b = make_people(), make_people()
+    alice = add_person(a, "Alice")
+    add_record(alice, "Debit", "10", OLD)
+    sync(a, central)
+    sync(b, central)
+    copy = b.controls[0]
+    assert [i.amount for i in live_records(copy)] == [Decimal(10)]
+
+    alice.view.records.archive_before(datetime.now() - timedelta(days=90))
+    sync(a, central)
+    sync(b, central)
+    assert live_records(copy) == []
+    assert [i.amount for i in copy.view.records.archive] == [Decimal(10)]
+    assert copy.net_owed == Decimal(10)
+    assert b.totals.net == Decimal(10)
+
+
+def select(*records: RecordTile):
+    for i in records:
+        i.checkbox.value = True
+
+
+def make_alice() -> tuple[NameList, NameTile, RecordTile, RecordTile, RecordTile]:
+    people = make_people()
+    alice = add_person(people, "Alice")
+    debit = add_record(alice, "Debit", "10", OLD)
+    credit = add_record(alice, "Credit", "4")
+    kept = add_record(alice, "Debit", "1")
+    return people, alice, debit, credit, kept
+
+
+def test_remove_selected():
+    people, alice, debit, credit, kept = make_alice()
+    select(debit, credit)
+    alice.view.records.remove_selected()
+    assert (alice.money_you_owe, alice.money_they_owe) == (1, 0)
+    assert alice.net_owed == 1
+    assert people.totals.people[alice.id] == (1, 0)
+    assert people.totals.net == 1
+    assert alice.history.last == people.history.last == 1.0
+    assert live_records(alice) == [kept]
+    assert alice.view.records.deleted_ids == {debit.id, credit.id}
+
+
+def test_retype_selected():
+    people, alice, debit, credit, kept = make_alice()
+    select(debit, credit)
+    alice.view.records.retype_selected()
+    assert (debit._type, credit._type, kept._type) == ("Credit", "Debit", "Debit")
+    assert (alice.money_you_owe, alice.money_they_owe) == (5, 10)
+    assert alice.net_owed == -5
+    assert people.totals.people[alice.id] == (5, 10)
+    assert people.totals.net == -5
+    assert alice.history.last == people.history.last == -5.0
+    # The swapped debit's change is at its own date
+    assert alice.history.downsample(end=OLD.timestamp())[-1] == (OLD.timestamp(), -10.0)
+
+
+def test_move_selected():
+    people, alice, debit, credit, kept = make_alice()
+    bob = add_person(people, "Bob")
+    add_record(bob, "Debit", "2", OLD - timedelta(days=1))
+    select(debit, credit)
+    alice.view.records.move_selected(bob)
+    assert (alice.money_you_owe, alice.money_they_owe) == (1, 0)
+    assert (bob.money_you_owe, bob.money_they_owe) == (12, 4)
+    assert (alice.net_owed, bob.net_owed) == (1, 8)
+    assert people.totals.people[alice.id] == (1, 0)
+    assert people.totals.people[bob.id] == (12, 4)
+    assert people.totals.net == 9
+    assert (alice.history.last, bob.history.last) == (1.0, 8.0)
+    assert people.history.last == 9.0
+    assert live_records(alice) == [kept]
+    assert set(live_records(bob)) >= {debit, credit}
+    assert debit.view is bob.view
+    assert bob.lastTransaction == credit.dateCreated
+
+
+def test_totals_header_is_redrawn_once_per_burst():
+    async def run() -> list[Decimal]:
+        view = main.build_name_view(RouteManager(None))
+        drawn = []
+        view.show_totals = lambda: drawn.append(view.list.totals.net)
+        alice = add_person(view.list, "Alice")
+        for _ in range(20):
+            add_record(alice, "Debit", "1")
+        assert drawn == []
+        await asyncio.sleep(main.TOTALS_INTERVAL + 0.2)
+        return drawn
+
+    assert asyncio.run(run()) == [20]
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from dt.archive import ArchivedRecord, write_archive
+from dt.statements import generate_statements, statement_rows
+
+START = datetime(2024, 3, 1)
+END = datetime(2024, 3, 31, 23, 59, 59, 999999)
+TICK = timedelta(microseconds=1)
+
+
+def record(type: str, amount: str, date: datetime, title: str = "t") -> dict:
+    return {
+        "type": type,
+        "title": title,
+        "description": "d",
+        "amount": Decimal(amount),
+        "dateCreated": date,
+    }
+
+
+def person(records: list[dict], archive=None) -> dict:
+    return {"id": "p", "name": "P", "records": records, "archive": archive}
+
+
+def test_live_records_only():
+    records = [
+        record("Debit", "10", START - timedelta(days=1)),
+        record("Credit", "3", START + timedelta(days=2), "b"),
+        record("Debit", "5", START + timedelta(days=1), "a"),
+        record("Debit", "100", END + timedelta(days=1)),
+    ]
+    opening, rows, closing = statement_rows(person(records), START, END)
+    assert opening == 10
+    assert [(i[2], i[4], i[5]) for i in rows] == [
+        ("a", Decimal(5), Decimal(15)),
+        ("b", Decimal(3), Decimal(12)),
+    ]
+    assert closing == 12
+
+
+def test_archive_and_live_records(tmp_path):
+    path = tmp_path / "a.dtarc"
+    write_archive(
+        path,
+        [
+            ArchivedRecord(
+                "Debit", "old", "d", Decimal(20), START - timedelta(days=40)
+            ),
+            ArchivedRecord(
+                "Credit", "old", "d", Decimal(4), START - timedelta(days=30)
+            ),
+            ArchivedRecord("Debit", "arch", "d", Decimal(1), START + timedelta(days=3)),
+        ],
+    )
+    records = [
+        record("Credit", "2", START - timedelta(days=2)),
+        record("Debit", "7", START + timedelta(days=1), "live"),
+    ]
+    opening, rows, closing = statement_rows(person(records, str(path)), START, END)
+    assert opening == 20 - 4 - 2
+    assert [(i[2], i[5]) for i in rows] == [
+        ("live", Decimal(21)),
+        ("arch", Decimal(22)),
+    ]
+    assert closing == 22
+
+
+def test_records_on_the_edges(tmp_path):
+    # A record at the start is in the period, not the opening balance, and one
+    # at the end is still in it, from the archive and from live records alike
+    path = tmp_path / "a.dtarc"
+    write_archive(
+        path,
+        [
+            ArchivedRecord("Debit", "before", "d", Decimal(1), START - TICK),
+            ArchivedRecord("Debit", "a-start", "d", Decimal(2), START),
+            ArchivedRecord("Debit", "a-end", "d", Decimal(4), END),
+            ArchivedRecord("Debit", "after", "d", Decimal(8), END + TICK),
+        ],
+    )
+    records = [
+        record("Credit", "10", START - TICK, "before"),
+        record("Credit", "20", START, "l-start"),
+        record("Credit", "40", END, "l-end"),
+        record("Credit", "80", END + TICK, "after"),
+    ]
+    opening, rows, closing = statement_rows(person(records, str(path)), START, END)
+    assert opening == 1 - 10
+    assert sorted(i[2] for i in rows) == ["a-end", "a-start", "l-end", "l-start"]
+    assert closing == opening + 2 + 4 - 20 - 40
+
+
+def test_generate_statements(tmp_path):
+    people = [{**person([record("Debit", "1", START)]), "id": str(i)} for i in range(3)]
+    progress = []
+    done = generate_statements(
+        iter(people),
+        len(people),
+        START,
+        END,
+        tmp_path,
+        workers=1,
+        on_progress=lambda done, total: progress.append((done, total)),
+    )
+    assert done == 3
+    assert progress[-1] == (3, 3)
+    assert len(list(tmp_path.glob("*.csv"))) == len(list(tmp_path.glob("*.html"))) == 3
@@ -0,0 +1,212 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from dt.sync import (
+    DEPTH,
+    PERSON_BUCKET,
+    SHARD_DIGITS,
+    HttpPeer,
+    Replica,
+    ReplicaStore,
+    install,
+    reconcile,
+)
+
+
+def add_person(replica: Replica, person: str, name: str):
+    replica.put(person, "person", person, PERSON_BUCKET, {"name": name})
+
+
+def add_record(replica: Replica, id: str, person: str, amount: str):
+    replica.put(id, "record", person, "2024-01", {"amount": amount})
+
+
+def make_pair() -> tuple[Replica, Replica]:
+    a, b = Replica("a"), Replica("b")
+    for person in ("p1", "p2"):
+        add_person(a, person, person.upper())
+    for i in range(20):
+        add_record(a, f"r{i}", "p1" if i % 2 else "p2", str(i))
+    reconcile(b, a)
+    return a, b
+
+
+def test_converges():
+    a, b = make_pair()
+    assert a.root() == b.root()
+    assert b.entries == a.entries
+    add_record(b, "new", "p1", "5")
+    add_person(a, "p3", "P3")
+    result = reconcile(a, b)
+    assert (result.pulled, result.pushed) == (1, 1)
+    assert result.changed == {"p1"}
+    assert a.root() == b.root()
+    assert reconcile(a, b) == (0, 0, set())
+
+
+def test_last_writer_wins_on_record():
+    a, b = make_pair()
+    add_record(a, "r1", "p1", "100")
+    add_record(b, "r1", "p1", "200")
+    # Both edited without seeing each other, the later clock wins everywhere
+    b._clock = a._clock + 1_000_000
+    add_record(b, "r1", "p1", "300")
+    reconcile(a, b)
+    assert a.entries["r1"]["data"] == {"amount": "300"}
+    assert b.entries["r1"]["data"] == {"amount": "300"}
+    assert a.root() == b.root()
+
+
+def test_last_writer_wins_on_name():
+    a, b = make_pair()
+    add_person(b, "p1", "Bee")
+    a._clock = b._clock + 1_000_000
+    add_person(a, "p1", "Ay")
+    reconcile(b, a)
+    assert a.entries["p1"]["data"] == b.entries["p1"]["data"] == {"name": "Ay"}
+
+
+def test_tombstones():
+    a, b = make_pair()
+    assert a.delete("r3")
+    assert not a.delete("r3")
+    result = reconcile(b, a)
+    assert result.pulled == 1
+    assert b.entries["r3"]["deleted"]
+    # A stale edit from before the delete doesn't bring it back
+    stale = {**b.entries["r3"], "deleted": False, "clock": (0, "a")}
+    assert b.apply([stale]) == (0, set())
+    assert b.entries["r3"]["deleted"]
+
+
+def test_move_between_people():
+    a, b = make_pair()
+    entry = a.entries["r1"]
+    a.put("r1", "record", "p2", entry["bucket"], entry["data"])
+    result = reconcile(b, a)
+    assert result.changed == {"p1", "p2"}
+    assert b.entries["r1"]["person"] == "p2"
+    assert "r1" not in {i["id"] for i in b.person_entries("p1")}
+    assert "r1" in {i["id"] for i in b.person_entries("p2")}
+    assert a.root() == b.root()
+
+
+def test_archived_records_stay_archived():
+    a, b = make_pair()
+    assert a.archive("r2")
+    reconcile(b, a)
+    assert b.entries["r2"]["archived"]
+    # A copy still held as a live record elsewhere doesn't revive it
+    assert not b.put("r2", "record", "p2", "2024-01", {"amount": "99"})
+    assert b.delete("r2")
+    reconcile(a, b)
+    assert a.entries["r2"]["deleted"]
+
+
+def test_pulled_counts_only_accepted():
+    a, b = make_pair()
+    add_record(a, "r1", "p1", "old")
+    b._clock = a._clock + 1_000_000
+    add_record(b, "r1", "p1", "new")
+    result = reconcile(b, a)
+    assert result.pulled == 0
+    assert result.pushed == 1
+    assert a.entries["r1"]["data"] == {"amount": "new"}
+
+
+def test_fan_out_is_bounded():
+    replica = Replica()
+    add_person(replica, "p1", "P1")
+    for i in range(2000):
+        add_record(replica, f"r{i}", "p1", str(i))
+    path: tuple[str, ...] = ()
+    while len(path) < DEPTH:
+        children = replica.children(path)
+        if len(path) in (0, 3):
+            assert len(children) <= 16**SHARD_DIGITS
+        path = (*path, next(k for k in children if k != PERSON_BUCKET))
+    assert len(replica.children(path)) < 2000 / 16**SHARD_DIGITS * 4
+
+
+def test_removed_entries_leave_no_empty_nodes():
+    replica = Replica()
+    add_record(replica, "r1", "p1", "1")
+    replica.put("r1", "record", "p2", "2024-01", {"amount": "1"})
+    assert replica.person_entries("p1") == []
+    assert len(replica.children(())) == 1
+    other = Replica()
+    add_record(other, "r1", "p2", "1")
+    assert set(replica.children(())) == set(other.children(()))
+
+
+class ClientPeer(HttpPeer):
+    # The same calls as over the network, to an app in this process
+    def __init__(self, client: TestClient, token: str | None = None):
+        super().__init__("/sync", token)
+        self.client = client
+
+    def _call(self, call: str, **args):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        response = self.client.post(
+            self.url, json={"call": call, **args}, headers=headers
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def serve_store(store: ReplicaStore, token: str | None = None) -> TestClient:
+    app = FastAPI()
+    install(app, store, token)
+    return TestClient(app)
+
+
+def test_store_logs_json_and_compacts_on_start(tmp_path):
+    path = tmp_path / "central.jsonl"
+    a, _ = make_pair()
+    reconcile(a, ReplicaStore(path))
+    add_record(a, "r1", "p1", "edited")
+    store = ReplicaStore(path)
+    result = reconcile(a, store)
+    assert (result.pulled, result.pushed) == (0, 1)
+    # Only the edit was written
+    assert len(path.read_text().splitlines()) == 23
+    assert all(json.loads(i)["id"] for i in path.read_text().splitlines())
+
+    reloaded = ReplicaStore(path)
+    assert reloaded.root() == a.root()
+    assert reloaded.replica.entries["r1"]["data"] == {"amount": "edited"}
+    assert len(path.read_text().splitlines()) == 22
+
+
+def test_sync_over_http(tmp_path):
+    store = ReplicaStore(tmp_path / "central.jsonl")
+    client = serve_store(store, "secret")
+    a, _ = make_pair()
+    assert reconcile(a, ClientPeer(client, "secret")).pushed == 22
+    b = Replica("b")
+    result = reconcile(b, ClientPeer(client, "secret"))
+    assert result.pulled == 22
+    assert result.changed == {"p1", "p2"}
+    assert b.root() == a.root() == store.root()
+
+
+def test_sync_rejects_bad_requests(tmp_path):
+    store = ReplicaStore(tmp_path / "central.jsonl")
+    client = serve_store(store, "secret")
+    assert client.post("/sync", json={"call": "root"}).status_code == 401
+    headers = {"Authorization": "Bearer secret"}
+    a, _ = make_pair()
+    good = a.entries["r1"]
+    for request in (
+        {"call": "apply", "entries": [good, {**good, "clock": "later"}]},
+        {"call": "apply", "entries": [good, {"id": "r2"}]},
+        {"call": "children", "path": ["x"] * (DEPTH + 1)},
+        {"call": "unknown"},
+        {"path": []},
+    ):
+        assert client.post("/sync", json=request, headers=headers).status_code == 400
+    # Nothing from a rejected batch was taken
+    assert store.replica.entries == {}
+    assert not (tmp_path / "central.jsonl").read_text()
@@ -0,0 +1,73 @@
+import random
+from decimal import Decimal
+from uuid import uuid4
+
+from dt.totals import GlobalTotals
+
+
+def test_sums_and_net():
+    totals = GlobalTotals()
+    a, b = uuid4(), uuid4()
+    totals.apply(a, Decimal(10), Decimal(0))
+    totals.apply(b, Decimal(0), Decimal(25))
+    totals.apply(a, Decimal(0), Decimal(4))
+    assert (totals.you_owe, totals.they_owe, totals.net) == (10, 29, -19)
+    assert totals.people[a] == (10, 4)
+
+
+def test_top_people_follow_changes():
+    totals = GlobalTotals()
+    a, b, c = uuid4(), uuid4(), uuid4()
+    totals.apply(a, Decimal(0), Decimal(30))
+    totals.apply(b, Decimal(0), Decimal(20))
+    totals.apply(c, Decimal(5), Decimal(0))
+    assert totals.top_debtors(2) == [(a, 30), (b, 20)]
+    assert totals.top_creditors(2) == [(c, 5)]
+    # a settles up and then owes, its older heap entries are stale
+    totals.apply(a, Decimal(40), Decimal(0))
+    assert totals.top_debtors(2) == [(b, 20)]
+    assert totals.top_creditors(2) == [(a, 10), (c, 5)]
+    # Asking again gives the same answer, stale entries were dropped for good
+    assert totals.top_creditors(2) == [(a, 10), (c, 5)]
+
+
+def test_remove():
+    totals = GlobalTotals()
+    a, b = uuid4(), uuid4()
+    totals.apply(a, Decimal(0), Decimal(30))
+    totals.apply(b, Decimal(7), Decimal(0))
+    totals.remove(a, uuid4())
+    assert (totals.you_owe, totals.they_owe) == (7, 0)
+    assert totals.top_debtors(3) == []
+    assert totals.top_creditors(3) == [(b, 7)]
+    assert a not in totals.people
+
+
+def test_on_change():
+    totals = GlobalTotals()
+    calls = []
+    totals.on_change = lambda: calls.append(totals.net)
+    a = uuid4()
+    totals.apply(a, Decimal(0), Decimal(0))
+    totals.apply(a, Decimal(3), Decimal(0))
+    totals.remove(a)
+    totals.remove(a)
+    assert calls == [3, 0]
+
+
+def test_heaps_stay_compact_and_correct():
+    rng = random.Random(3)
+    totals = GlobalTotals()
+    people = [uuid4() for _ in range(20)]
+    for _ in range(5000):
+        person = rng.choice(people)
+        totals.apply(person, Decimal(rng.randint(0, 50)), Decimal(rng.randint(0, 50)))
+    live = len(totals._versions)
+    assert len(totals._debtors) <= 2 * live + 16
+    assert len(totals._creditors) <= 2 * live + 16
+
+    nets = {p: you - they for p, (you, they) in totals.people.items()}
+    owed_to_you = sorted((-n for n in nets.values() if n < 0), reverse=True)
+    you_owe = sorted((n for n in nets.values() if n > 0), reverse=True)
+    assert [n for _, n in totals.top_debtors(5)] == owed_to_you[:5]
+    assert [n for _, n in totals.top_creditors(5)] == you_owe[:5]